@@ -0,0 +1,282 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pyface.qt import QtCore, QtGui
+from traits.api import Event, Instance, List, observe, Str
+from traitsui.api import BasicEditorFactory
+from traitsui.qt4.editor import Editor
+
+#: Number of consecutive rows of a column formatted at once
+BLOCK_SIZE = 256
+
+#: Maximum number of formatted blocks of rows kept
+MAX_CACHED_BLOCKS = 512
+
+
+def format_value(value):
+    """Format a cell value for display, with an empty string for missing
+    values, and without the decimal part of whole floats.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, (float, np.floating)):
+        if np.isnan(value):
+            return ""
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+    return str(value)
+
+
+class _DataFrameTableModel(QtCore.QAbstractTableModel):
+    """Read-only Qt table model backed by the column arrays of a DataFrame.
+
+    Qt only asks for the cells it displays: they are formatted on demand, a
+    block of BLOCK_SIZE rows of a column at a time, and the formatted blocks
+    are kept in a bounded least recently used cache. No per-cell object is
+    created when a DataFrame is set.
+    """
+
+    def __init__(self, columns=None, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.data_frame = None
+        #: Names of the displayed columns
+        self._names = []
+        #: Values of each displayed column, None for missing columns
+        self._arrays = []
+        #: Position in the DataFrame of each displayed row, if sorted
+        self._order = None
+        #: Column and Qt sort order the rows are sorted by, if any
+        self._sorted_by = None
+        self._blocks = OrderedDict()
+
+    def set_data_frame(self, data_frame):
+        """Display another DataFrame, or the same one with updated values.
+        """
+        names = list(self.columns or
+                     (data_frame.columns if data_frame is not None else []))
+        same_columns = names == self._names
+        same_layout = (
+            same_columns and
+            self.data_frame is not None and data_frame is not None and
+            data_frame.index.equals(self.data_frame.index)
+        )
+        resorted = same_layout and self._sorted_by is not None
+        if resorted:
+            self.layoutAboutToBeChanged.emit()
+        elif not same_layout:
+            self.beginResetModel()
+        self.data_frame = data_frame
+        self._names = names
+        self._arrays = self._column_arrays()
+        self._blocks.clear()
+        if resorted:
+            # Keep the rows sorted by the new values
+            self._order = self._sort_order(*self._sorted_by)
+            self.layoutChanged.emit()
+        elif same_layout:
+            # Let the view repaint the visible cells
+            if self.rowCount() and self.columnCount():
+                self.dataChanged.emit(
+                    self.index(0, 0),
+                    self.index(self.rowCount() - 1, self.columnCount() - 1)
+                )
+        else:
+            # Keep sorting by the same column, if the columns are the same
+            self._order = None
+            if not same_columns:
+                self._sorted_by = None
+            elif self._sorted_by is not None and data_frame is not None:
+                self._order = self._sort_order(*self._sorted_by)
+            self.endResetModel()
+
+    def update_rows(self, labels):
+        """Show the new values of the rows of the DataFrame with the provided
+        index labels, changed in place.
+
+        Only these rows are formatted again, unless the rows are sorted, in
+        which case they are sorted again.
+        """
+        if self.data_frame is None:
+            return
+        self._arrays = self._column_arrays()
+        if self._sorted_by is not None:
+            self.layoutAboutToBeChanged.emit()
+            self._order = self._sort_order(*self._sorted_by)
+            self._blocks.clear()
+            self.layoutChanged.emit()
+            return
+
+        rows = self.data_frame.index.get_indexer(labels)
+        rows = rows[rows >= 0]
+        if not len(rows) or not self.columnCount():
+            return
+        for start in np.unique(rows - rows % BLOCK_SIZE).tolist():
+            for column in range(self.columnCount()):
+                self._blocks.pop((column, start), None)
+        self.dataChanged.emit(
+            self.index(int(rows.min()), 0),
+            self.index(int(rows.max()), self.columnCount() - 1)
+        )
+
+    # QAbstractTableModel interface -------------------------------------------
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.data_frame is None:
+            return 0
+        return len(self.data_frame)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._names)
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if role != QtCore.Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if self._arrays[column] is None:
+            return ""
+        start = row - row % BLOCK_SIZE
+        return self._block(column, start)[row - start]
+
+    def headerData(self, section, orientation,
+                   role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if role != QtCore.Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Orientation.Horizontal:
+            return str(self._names[section])
+        if self._order is not None:
+            section = self._order[section]
+        return format_value(self.data_frame.index[section])
+
+    def sort(self, column, order=QtCore.Qt.SortOrder.AscendingOrder):
+        if self.data_frame is None or self._arrays[column] is None:
+            return
+        self.layoutAboutToBeChanged.emit()
+        self._sorted_by = (column, order)
+        self._order = self._sort_order(column, order)
+        self._blocks.clear()
+        self.layoutChanged.emit()
+
+    # Private methods ---------------------------------------------------------
+
+    def _column_arrays(self):
+        """Return the values of each displayed column, None for missing
+        columns.
+        """
+        return [
+            self.data_frame[name].to_numpy()
+            if self.data_frame is not None and name in self.data_frame.columns
+            else None
+            for name in self._names
+        ]
+
+    def _sort_order(self, column, order):
+        """Return the positions of the rows sorted by a column, with
+        missing values last.
+        """
+        if self._arrays[column] is None:
+            return None
+        values = pd.Series(self._arrays[column])
+        ascending = order == QtCore.Qt.SortOrder.AscendingOrder
+        try:
+            return values.sort_values(
+                ascending=ascending, na_position="last", kind="stable"
+            ).index.to_numpy()
+        except TypeError:
+            # Values of different types: sort them as displayed
+            formatted = values.map(format_value).where(values.notna())
+            return formatted.sort_values(
+                ascending=ascending, na_position="last", kind="stable"
+            ).index.to_numpy()
+
+    def _block(self, column, start):
+        """Return the formatted values of a column for BLOCK_SIZE rows from
+        start.
+        """
+        key = (column, start)
+        block = self._blocks.get(key)
+        if block is not None:
+            self._blocks.move_to_end(key)
+            return block
+
+        stop = start + BLOCK_SIZE
+        array = self._arrays[column]
+        if self._order is None:
+            values = array[start:stop]
+        else:
+            values = array[self._order[start:stop]]
+        block = [format_value(value) for value in values.tolist()]
+        self._blocks[key] = block
+        if len(self._blocks) > MAX_CACHED_BLOCKS:
+            self._blocks.popitem(last=False)
+        return block
+
+
+class _DataFrameTableEditor(Editor):
+
+    scrollable = True
+
+    table_model = Instance(_DataFrameTableModel)
+
+    #: Fired with the index labels of rows changed in place
+    rows_updated = Event
+
+    def init(self, parent):
+        """Create and initialize the underlying toolkit widget.
+        """
+        self.table_model = _DataFrameTableModel(
+            columns=self.factory.columns or None
+        )
+        self.control = QtGui.QTableView()
+        self.control.setModel(self.table_model)
+        # Rows are displayed unsorted until a column header is clicked
+        self.control.horizontalHeader().setSortIndicator(
+            -1, QtCore.Qt.SortOrder.AscendingOrder
+        )
+        self.control.setSortingEnabled(True)
+        self.control.setAlternatingRowColors(True)
+        # Don't measure rows: all rows have the same height.
+        header = self.control.verticalHeader()
+        header.setSectionResizeMode(QtGui.QHeaderView.ResizeMode.Fixed)
+        header.setDefaultSectionSize(
+            self.control.fontMetrics().height() + 6
+        )
+        self.set_tooltip()
+        self.sync_value(self.factory.rows_updated, "rows_updated", "from")
+        self.update_editor()
+
+    def update_editor(self):
+        """Updates the editor when the value changes externally to the editor.
+        """
+        self.table_model.set_data_frame(self.value)
+
+    @observe("rows_updated")
+    def _update_rows(self, event):
+        self.table_model.update_rows(event.new)
+
+    def dispose(self):
+        if self.control is not None:
+            self.control.setModel(None)
+        super().dispose()
+
+
+class DataFrameTableEditor(BasicEditorFactory):
+    """Read-only editor for large DataFrames.
+
+    Unlike traitsui's DataFrameEditor, only the visible cells are read and
+    formatted, so DataFrames of hundreds of thousands of rows can be
+    displayed and scrolled smoothly. Clicking a column header sorts the rows.
+    """
+    klass = _DataFrameTableEditor
+
+    #: Names of the columns to display, in order. All columns if empty.
+    #: Columns missing from the DataFrame are displayed empty.
+    columns = List(Str)
+
+    #: Extended name of an event fired with the index labels of rows whose
+    #: values were changed in place, to only update these rows rather than
+    #: the whole table.
+    rows_updated = Str
@@ -44,5 +44,64 @@ class _MplFigureEditor(Editor):
         layout.addWidget(canvas)
 
 
+class BlitOverlay:
+    """Layer of animated artists drawn over the cached rendering of the rest
+    of a figure.
+
+    Artists added to the overlay are excluded from regular draws of the
+    figure. Each time the figure is drawn, its rendering is cached and the
+    overlay is drawn on top. Calling update after changing the overlay's
+    artists then only restores the cached rendering, draws the overlay
+    artists and blits the result, rather than rendering the whole figure
+    again. Canvases which can't blit are redrawn instead.
+    """
+
+    def __init__(self, figure):
+        self.figure = figure
+        self.artists = []
+        self._background = None
+        # Callbacks are stored by the figure: this survives canvas changes.
+        figure.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def add(self, artist):
+        """Add an artist of the figure to the overlay.
+        """
+        artist.set_animated(True)
+        self.artists.append(artist)
+        return artist
+
+    def discard(self, artist):
+        """Remove an artist from the overlay and from the figure.
+        """
+        self.artists.remove(artist)
+        artist.remove()
+
+    def update(self):
+        """Show the current state of the overlay artists.
+        """
+        canvas = self.figure.canvas
+        if self._background is None or not canvas.supports_blit:
+            canvas.draw_idle()
+            return
+        canvas.restore_region(self._background)
+        self._draw_artists()
+        canvas.blit(self.figure.bbox)
+
+    def _on_draw(self, event):
+        # Figures are also drawn when saved, on other canvases (e.g. PDF or
+        # SVG ones) or at another resolution: don't keep these renderings.
+        canvas = event.canvas
+        if canvas.supports_blit and not canvas.is_saving():
+            self._background = canvas.copy_from_bbox(self.figure.bbox)
+        else:
+            self._background = None
+        for artist in self.artists:
+            artist.draw(event.renderer)
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            self.figure.draw_artist(artist)
+
+
 class MplFigureEditor(BasicEditorFactory):
     klass = _MplFigureEditor
@@ -0,0 +1,136 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+from pyface.qt import QtCore
+from traits.api import HasTraits, Instance
+from traitsui.api import Item, View
+from traitsui.testing.api import IsVisible, UITester
+
+from ets_tutorial.util.data_frame_table_editor import (
+    _DataFrameTableModel, DataFrameTableEditor, format_value,
+    MAX_CACHED_BLOCKS
+)
+
+
+def large_data_frame(num_rows=200_000):
+    return pd.DataFrame({
+        "name": np.array([f"img_{i}.jpg" for i in range(num_rows)],
+                         dtype=object),
+        "faces": np.where(np.arange(num_rows) % 3, 1., np.nan),
+    })
+
+
+class Table(HasTraits):
+    data = Instance(pd.DataFrame)
+
+    view = View(
+        Item("data", editor=DataFrameTableEditor(columns=["name", "faces"]),
+             show_label=False),
+        resizable=True
+    )
+
+
+class TestDataFrameTableModel(unittest.TestCase):
+    def cell(self, model, row, column):
+        return model.data(model.index(row, column))
+
+    def test_format_value(self):
+        self.assertEqual(format_value(np.nan), "")
+        self.assertEqual(format_value(None), "")
+        self.assertEqual(format_value(2.), "2")
+        self.assertEqual(format_value(2.5), "2.5")
+        self.assertEqual(format_value("2:1"), "2:1")
+
+    def test_only_visited_cells_formatted(self):
+        model = _DataFrameTableModel(columns=["name", "faces", "missing"])
+        model.set_data_frame(large_data_frame())
+        self.assertEqual(model.rowCount(), 200_000)
+        self.assertEqual(model.columnCount(), 3)
+        self.assertEqual(len(model._blocks), 0)
+
+        self.assertEqual(self.cell(model, 150_001, 0), "img_150001.jpg")
+        self.assertEqual(self.cell(model, 150_001, 1), "1")
+        self.assertEqual(self.cell(model, 150_000, 1), "")
+        self.assertEqual(self.cell(model, 150_000, 2), "")
+        self.assertEqual(len(model._blocks), 2)
+
+        header = model.headerData(1, QtCore.Qt.Orientation.Horizontal)
+        self.assertEqual(header, "faces")
+
+    def test_block_cache_bounded(self):
+        model = _DataFrameTableModel()
+        model.set_data_frame(large_data_frame())
+        for row in range(0, 200_000, 100):
+            self.cell(model, row, 0)
+        self.assertEqual(len(model._blocks), MAX_CACHED_BLOCKS)
+
+    def test_sort(self):
+        model = _DataFrameTableModel()
+        model.set_data_frame(pd.DataFrame({"faces": [2., np.nan, 0., 1.]}))
+        model.sort(0, QtCore.Qt.SortOrder.DescendingOrder)
+        cells = [self.cell(model, row, 0) for row in range(4)]
+        self.assertEqual(cells, ["2", "1", "0", ""])
+        row_header = model.headerData(3, QtCore.Qt.Orientation.Vertical)
+        self.assertEqual(row_header, "1")
+
+        # Updated values are kept sorted
+        model.set_data_frame(pd.DataFrame({"faces": [2., 3., 0., 1.]}))
+        cells = [self.cell(model, row, 0) for row in range(4)]
+        self.assertEqual(cells, ["3", "2", "1", "0"])
+
+    def test_sort_mixed_types(self):
+        model = _DataFrameTableModel()
+        model.set_data_frame(pd.DataFrame({"value": ["b", 1, None]}))
+        model.sort(0)
+        cells = [self.cell(model, row, 0) for row in range(3)]
+        self.assertEqual(cells, ["1", "b", ""])
+
+    def test_updated_values(self):
+        model = _DataFrameTableModel()
+        data = pd.DataFrame({"faces": [np.nan, np.nan]})
+        model.set_data_frame(data)
+        self.assertEqual(self.cell(model, 0, 0), "")
+        changes = []
+        model.dataChanged.connect(lambda *args: changes.append(args))
+        data.loc[0, "faces"] = 3.
+        model.set_data_frame(data)
+        self.assertEqual(self.cell(model, 0, 0), "3")
+        self.assertEqual(len(changes), 1)
+
+    def test_rows_updated_in_place(self):
+        model = _DataFrameTableModel()
+        data = large_data_frame(1000)
+        model.set_data_frame(data)
+        self.assertEqual(self.cell(model, 0, 1), "")
+        self.assertEqual(self.cell(model, 900, 1), "")
+        changes = []
+        model.dataChanged.connect(
+            lambda first, last: changes.append((first.row(), last.row()))
+        )
+        data.loc[[0, 3], "faces"] = [3., 4.]
+        data.loc[900, "faces"] = 5.
+        model.update_rows([0, 3])
+        self.assertEqual(changes, [(0, 3)])
+        self.assertEqual(self.cell(model, 0, 1), "3")
+        self.assertEqual(self.cell(model, 3, 1), "4")
+        # Other blocks of rows aren't formatted again
+        self.assertEqual(self.cell(model, 900, 1), "")
+
+        # Sorted rows are sorted again
+        model.sort(1, QtCore.Qt.SortOrder.DescendingOrder)
+        data.loc[1, "faces"] = 6.
+        model.update_rows([1])
+        self.assertEqual(self.cell(model, 0, 1), "6")
+
+
+class TestDataFrameTableEditor(unittest.TestCase):
+    def test_data_frame_table_editor(self):
+        tester = UITester()
+        table = Table(data=large_data_frame(1000))
+        with tester.create_ui(table) as ui:
+            data = tester.find_by_name(ui, "data")
+            data.inspect(IsVisible())
+            table.data = large_data_frame(10)
+            editor = ui.get_editors("data")[0]
+            self.assertEqual(editor.table_model.rowCount(), 10)
@@ -1,12 +1,16 @@
+import io
 import unittest
 
 import numpy as np
+import PIL.Image
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
 from traits.api import HasTraits, Instance
 from traitsui.api import Item, View
 from traitsui.testing.api import UITester, IsVisible
 
-from ets_tutorial.util.mpl_figure_editor import MplFigureEditor
+from ets_tutorial.util.mpl_figure_editor import BlitOverlay, MplFigureEditor
 
 
 class Plot(HasTraits):
@@ -36,3 +40,72 @@ class TestMplFigureEditor(unittest.TestCase):
             # smoke test: just check if Plot can create its UI
             figure = tester.find_by_name(ui, "figure")
             figure.inspect(IsVisible())
+
+
+class TestBlitOverlay(unittest.TestCase):
+    def center_color(self, canvas):
+        pixels = np.asarray(canvas.buffer_rgba())
+        height, width = pixels.shape[:2]
+        return tuple(pixels[height // 2, width // 2, :3])
+
+    def test_overlay_blitted(self):
+        figure = Figure()
+        canvas = FigureCanvasAgg(figure)
+        axes = figure.add_axes([0, 0, 1, 1])
+        overlay = BlitOverlay(figure)
+        rectangle = overlay.add(
+            axes.add_patch(Rectangle((0.25, 0.25), 0.5, 0.5, color="r"))
+        )
+        self.assertTrue(rectangle.get_animated())
+        canvas.draw()
+        self.assertEqual(self.center_color(canvas), (255, 0, 0))
+
+        # Overlay changes don't render the figure again
+        draws = []
+        canvas.mpl_connect("draw_event", draws.append)
+        rectangle.set_color("b")
+        overlay.update()
+        self.assertEqual(draws, [])
+        self.assertEqual(self.center_color(canvas), (0, 0, 255))
+
+        overlay.discard(rectangle)
+        overlay.update()
+        self.assertEqual(self.center_color(canvas), (255, 255, 255))
+        self.assertNotIn(rectangle, axes.patches)
+
+    def test_figure_saved(self):
+        figure = Figure(figsize=(2, 2))
+        canvas = FigureCanvasAgg(figure)
+        axes = figure.add_axes([0, 0, 1, 1])
+        overlay = BlitOverlay(figure)
+        overlay.add(axes.add_patch(
+            Rectangle((0.25, 0.25), 0.5, 0.5, color="r", gid="overlay")
+        ))
+        canvas.draw()
+        # The overlay is drawn on the canvases figures are saved with
+        output = io.BytesIO()
+        figure.savefig(output, format="svg")
+        self.assertIn(b'id="overlay"', output.getvalue())
+        output = io.BytesIO()
+        figure.savefig(output, format="pdf")
+        self.assertGreater(len(output.getvalue()), 0)
+        output = io.BytesIO()
+        figure.savefig(output, format="png", dpi=20)
+        output.seek(0)
+        pixels = np.asarray(PIL.Image.open(output))
+        self.assertEqual(tuple(pixels[20, 20, :3]), (255, 0, 0))
+
+        # Renderings made for saving aren't restored: the figure is drawn
+        # again instead
+        draws = []
+        canvas.mpl_connect("draw_event", draws.append)
+        overlay.update()
+        self.assertEqual(len(draws), 1)
+        self.assertEqual(self.center_color(canvas), (255, 0, 0))
+
+    def test_canvas_without_blitting(self):
+        figure = Figure()
+        overlay = BlitOverlay(figure)
+        overlay.add(figure.add_subplot(111).add_patch(Rectangle((0, 0), 1, 1)))
+        # Falls back to a (no-op) redraw of the default canvas
+        overlay.update()
@@ -0,0 +1,211 @@
+""" Detect faces in many image files at once.
+
+All batch face detection (folder scans, in the GUI thread or in the
+background, serial or parallel) goes through detect_faces_batch and
+iter_detect_faces_batch, so throughput is tuned in one place.
+
+Decoding and detection are pipelined: a few I/O threads decode (and convert
+to grayscale) the next images while the current one is searched, since PIL
+releases the GIL while decoding. Chunks of images can additionally be
+fanned out to an executor, e.g. a process pool, to search several images at
+once.
+"""
+# General imports
+from concurrent.futures import as_completed, ThreadPoolExecutor
+
+import pandas as pd
+
+# Local imports
+from pycasa.model.face_detector import get_face_detector
+from pycasa.model.image_file import ImageFile
+
+#: Number of image files sent to an executor's worker at once
+DEFAULT_CHUNK_SIZE = 16
+
+#: Number of images decoded ahead of the detection, in as many threads
+IO_MAX_WORKERS = 2
+
+FILEPATH_COL = "filepath"
+NUM_FACES_COL = "num_faces"
+FACES_COL = "faces"
+
+
+def detect_faces_batch(image_files, executor=None,
+                       chunk_size=DEFAULT_CHUNK_SIZE,
+                       io_workers=IO_MAX_WORKERS, detection_cache=None,
+                       keep_pixels=False, **kwargs):
+    """ Detect faces in many image files.
+
+    Returns a table with one row per image file, in the order provided, with
+    the path of the file, its number of faces and its faces (as an array of
+    FACE_DTYPE). The faces of the ImageFile objects provided are set too.
+
+    Parameters
+    ----------
+    image_files : list of ImageFile or str
+        Images to search, as ImageFile objects or paths.
+    executor : concurrent.futures.Executor, optional
+        Executor (e.g. a ProcessPoolExecutor) to search chunks of chunk_size
+        images on. Images are searched in the calling thread if None.
+    io_workers : int
+        Number of images decoded ahead of the detection.
+    detection_cache : DetectionCache, optional
+        Detection cache for the images provided as paths. ImageFile objects
+        use their own.
+    keep_pixels : bool
+        Whether to keep the pixels decoded in the pixel cache. They are
+        released once searched by default, so memory use doesn't grow with
+        the number of images.
+    **kwargs
+        Detection parameters (see get_face_detector).
+    """
+    images = _as_image_files(image_files, detection_cache)
+    faces_per_image = [None] * len(images)
+    for batch in iter_detect_faces_batch(
+        images, executor=executor, chunk_size=chunk_size,
+        io_workers=io_workers, keep_pixels=keep_pixels, **kwargs
+    ):
+        for position, faces in batch:
+            faces_per_image[position] = faces
+
+    for img, faces in zip(images, faces_per_image):
+        img.faces = faces
+    return pd.DataFrame({
+        FILEPATH_COL: [img.filepath for img in images],
+        NUM_FACES_COL: [len(faces) for faces in faces_per_image],
+        FACES_COL: faces_per_image,
+    })
+
+
+def iter_detect_faces_batch(image_files, executor=None,
+                            chunk_size=DEFAULT_CHUNK_SIZE,
+                            io_workers=IO_MAX_WORKERS, detection_cache=None,
+                            keep_pixels=False, **kwargs):
+    """ Detect faces in many image files, yielding results as they come.
+
+    Results are yielded as lists of (position in image_files, faces)
+    pairs: one image at a time when searching in the calling thread, one
+    chunk at a time, in completion order, when searching on an executor.
+    The faces of the ImageFile objects provided aren't set. Closing the
+    generator stops the search after the current image, and drops the chunks
+    not started yet. See detect_faces_batch for the parameters.
+    """
+    images = _as_image_files(image_files, detection_cache)
+    chunks = [
+        (start, images[start:start + chunk_size])
+        for start in range(0, len(images), chunk_size)
+    ]
+
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=io_workers) as io_executor:
+            for start, chunk in chunks:
+                results = _iter_detect_chunk(chunk, io_executor, io_workers,
+                                             keep_pixels, **kwargs)
+                for offset, faces in enumerate(results):
+                    yield [(start + offset, faces)]
+        return
+
+    # Workers get the paths rather than the ImageFile objects, which are
+    # cheaper to send and may be shared with the GUI.
+    futures = {
+        executor.submit(
+            _detect_chunk,
+            [(img.filepath, img.signature, img.detection_cache)
+             for img in chunk],
+            io_workers, keep_pixels, **kwargs
+        ): start
+        for start, chunk in chunks
+    }
+    try:
+        for future in as_completed(futures):
+            start = futures[future]
+            yield list(enumerate(future.result(), start))
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _as_image_files(image_files, detection_cache):
+    return [
+        img if isinstance(img, ImageFile) else
+        ImageFile(filepath=img, detection_cache=detection_cache)
+        for img in image_files
+    ]
+
+
+def _detect_chunk(specs, io_workers, keep_pixels, **kwargs):
+    """ Detect faces in a chunk of image files, described by (path,
+    signature, detection cache) triplets. Run by executor workers.
+    """
+    images = [
+        ImageFile(filepath=filepath, signature=signature,
+                  detection_cache=detection_cache)
+        for filepath, signature, detection_cache in specs
+    ]
+    with ThreadPoolExecutor(max_workers=io_workers) as io_executor:
+        return list(_iter_detect_chunk(images, io_executor, io_workers,
+                                       keep_pixels, **kwargs))
+
+
+def _iter_detect_chunk(images, io_executor, io_workers, keep_pixels,
+                       **kwargs):
+    """ Yield the faces detected in each image, in order.
+
+    Cached results are looked up for the whole chunk at once. The images to
+    search are decoded on io_executor, at most io_workers images ahead of
+    the detection, so that memory use stays bounded.
+    """
+    detector = get_face_detector(**kwargs)
+    cached = _get_cached_faces(images, detector)
+    to_decode = iter([
+        img for img, faces in zip(images, cached) if faces is None
+    ])
+
+    def decode_next():
+        img = next(to_decode, None)
+        if img is not None:
+            decoded.append(io_executor.submit(
+                img.detection_data, detector.max_side,
+                keep_pixels=keep_pixels
+            ))
+
+    decoded = []
+    for _ in range(io_workers + 1):
+        decode_next()
+
+    try:
+        for img, faces in zip(images, cached):
+            if faces is None:
+                img_data, shape = decoded.pop(0).result()
+                decode_next()
+                faces = detector.detect(img_data, shape=shape)
+                del img_data
+                if img.detection_cache is not None and img.filepath:
+                    img.detection_cache.set(img.filepath, detector, faces)
+            yield faces
+    finally:
+        for future in decoded:
+            future.cancel()
+
+
+def _get_cached_faces(images, detector):
+    """ Return the cached faces of each image (None if unknown), querying
+    each detection cache once.
+    """
+    cached = [None] * len(images)
+    positions_per_cache = {}
+    for position, img in enumerate(images):
+        if img.detection_cache is not None and img.filepath:
+            positions_per_cache.setdefault(
+                id(img.detection_cache), []
+            ).append(position)
+
+    for positions in positions_per_cache.values():
+        cache = images[positions[0]].detection_cache
+        results = cache.get_many(
+            [images[position].filepath for position in positions], detector,
+            signatures=[images[position].signature for position in positions]
+        )
+        for position, faces in zip(positions, results):
+            cached[position] = faces
+    return cached
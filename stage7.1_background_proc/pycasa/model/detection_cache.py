@@ -0,0 +1,123 @@
+# General imports
+import json
+import os
+from os.path import abspath, dirname, join
+import sqlite3
+import threading
+
+# ETS imports
+from traits.api import File, HasStrictTraits
+from traits.etsconfig.api import ETSConfig
+
+# Local imports
+from pycasa.model.faces import as_face_array, faces_to_list
+from pycasa.model.file_signature import file_signature
+
+CACHE_FILENAME = "face_detection_cache.sqlite"
+
+#: Maximum number of image paths looked up in a single query
+QUERY_BATCH_SIZE = 500
+
+# sqlite3 connections can't be shared between threads: keep one per thread
+# (and per worker process) and per database file.
+_connections = threading.local()
+
+
+def default_cache_filepath():
+    """ Location of the detection cache in the user's application data.
+    """
+    return join(ETSConfig.application_data, "pycasa", CACHE_FILENAME)
+
+
+class DetectionCache(HasStrictTraits):
+    """ Persistent cache of face detection results.
+
+    Results are stored in a SQLite database, keyed on the image path and the
+    detector (cascade file and detection parameters). An entry is only used
+    if the image file's size and modification time haven't changed since it
+    was stored.
+    """
+    #: Path to the SQLite database file
+    filepath = File
+
+    def get(self, img_filepath, detector):
+        """ Return the cached faces for an image, or None if unknown.
+        """
+        return self.get_many([img_filepath], detector)[0]
+
+    def get_many(self, img_filepaths, detector, signatures=None):
+        """ Return the cached faces for each image (None for unknown images)
+        in a single query.
+
+        The (size, mtime, ...) signatures of the files can be provided if
+        already known, e.g. from a directory listing, to avoid stat-ing them
+        again.
+        """
+        if signatures is None:
+            signatures = [None] * len(img_filepaths)
+        img_filepaths = [abspath(path) for path in img_filepaths]
+
+        # Only read the requested entries, using the primary key, in batches
+        # staying below SQLite's limit on the number of query parameters.
+        connection = self._connection()
+        entries = {}
+        unique_filepaths = list(dict.fromkeys(img_filepaths))
+        for start in range(0, len(unique_filepaths), QUERY_BATCH_SIZE):
+            batch = unique_filepaths[start:start + QUERY_BATCH_SIZE]
+            cursor = connection.execute(
+                "SELECT filepath, size, mtime, faces FROM faces "
+                "WHERE detector = ? AND filepath IN ({})".format(
+                    ", ".join("?" * len(batch))
+                ),
+                [detector.key] + batch
+            )
+            entries.update((row[0], row[1:]) for row in cursor)
+
+        results = []
+        for img_filepath, signature in zip(img_filepaths, signatures):
+            entry = entries.get(img_filepath)
+            if entry is None:
+                results.append(None)
+                continue
+            if not signature:
+                signature = file_signature(img_filepath)
+            if not signature or tuple(signature[:2]) != entry[:2]:
+                results.append(None)
+            else:
+                results.append(as_face_array(json.loads(entry[2])))
+        return results
+
+    def set(self, img_filepath, detector, faces):
+        """ Store the faces detected in an image.
+        """
+        signature = file_signature(img_filepath)
+        if signature is None:
+            return
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO faces VALUES (?, ?, ?, ?, ?)",
+                (abspath(img_filepath), detector.key) + signature[:2] +
+                (json.dumps(faces_to_list(as_face_array(faces))),)
+            )
+
+    def _connection(self):
+        connections = getattr(_connections, "connections", None)
+        if connections is None:
+            connections = _connections.connections = {}
+
+        if self.filepath not in connections:
+            os.makedirs(dirname(abspath(self.filepath)), exist_ok=True)
+            connection = sqlite3.connect(self.filepath, timeout=30)
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS faces ("
+                    "filepath TEXT, detector TEXT, size INTEGER, "
+                    "mtime INTEGER, faces TEXT, "
+                    "PRIMARY KEY (filepath, detector))"
+                )
+            connections[self.filepath] = connection
+        return connections[self.filepath]
+
+    def _filepath_default(self):
+        return default_cache_filepath()
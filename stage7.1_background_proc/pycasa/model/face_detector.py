@@ -0,0 +1,267 @@
+# General imports
+import json
+import threading
+
+import numpy as np
+import PIL.Image
+from skimage import data
+from skimage.feature import Cascade
+
+# ETS imports
+from traits.api import (
+    cached_property, File, Float, HasStrictTraits, Instance, Int, Property,
+    Str, Tuple
+)
+
+# Local imports
+from pycasa.model.faces import (
+    as_face_array, DEFAULT_IOU_THRESHOLD, empty_faces, non_max_suppression
+)
+
+DEFAULT_SCALE_FACTOR = 1.2
+
+DEFAULT_STEP_RATIO = 1
+
+DEFAULT_MIN_SIZE = (60, 60)
+
+DEFAULT_MAX_SIZE = (600, 600)
+
+#: Longest side of the working resolution, 0 for the full image resolution
+DEFAULT_MAX_SIDE = 0
+
+#: Side of the tiles large images are split into, 0 to never split images
+DEFAULT_TILE_SIZE = 0
+
+# One registry per thread: skimage's Cascade objects aren't meant to be shared
+# between threads, and each worker process gets its own copy of this module.
+_registry = threading.local()
+
+
+class FaceDetector(HasStrictTraits):
+    """ Pre-built LBP cascade together with its detection parameters.
+    """
+    #: Trained cascade file. Defaults to skimage's frontal face cascade.
+    trained_file = File
+
+    scale_factor = Float(DEFAULT_SCALE_FACTOR)
+
+    step_ratio = Float(DEFAULT_STEP_RATIO)
+
+    min_size = Tuple(DEFAULT_MIN_SIZE)
+
+    max_size = Tuple(DEFAULT_MAX_SIZE)
+
+    #: Longest side, in pixels, of the working resolution. Larger images are
+    #: downscaled before searching for faces, and the min_size and max_size
+    #: scaled accordingly, then the faces found are mapped back to the
+    #: original image. 0 to always search the full resolution image.
+    max_side = Int(DEFAULT_MAX_SIDE)
+
+    #: Intersection over union above which overlapping detections are merged
+    #: into the best one (see non_max_suppression). 1 to keep them all.
+    iou_threshold = Float(DEFAULT_IOU_THRESHOLD)
+
+    #: Side, in pixels of the working resolution, of the tiles larger images
+    #: are split into. Tiles overlap by more than the max_size of faces, so
+    #: each face is entirely inside a tile without touching its inner edges.
+    #: Memory used by the search is bounded by the tile size rather than the
+    #: image size. 0 to search whole images.
+    tile_size = Int(DEFAULT_TILE_SIZE)
+
+    #: Cascade built from the trained file, parsed once per detector
+    cascade = Property(Instance(Cascade), depends_on="trained_file")
+
+    #: String identifying the cascade file and detection parameters
+    key = Property(
+        Str,
+        depends_on="trained_file, scale_factor, step_ratio, min_size, "
+                   "max_size, max_side, iou_threshold, tile_size"
+    )
+
+    def detect(self, img_data, shape=None):
+        """ Detect faces in an image array and return them as an array of
+        FACE_DTYPE.
+
+        If img_data is a reduced version of a larger image, e.g. decoded at
+        a lower resolution, the shape of the full image can be provided:
+        faces are then returned in its coordinates.
+        """
+        if img_data.size == 0:
+            return empty_faces()
+        if shape is None:
+            shape = img_data.shape
+        height, width = shape[:2]
+        scale = self.working_scale(shape)
+        working_width = max(1, round(width * scale))
+        if img_data.shape[1] > working_width:
+            img_data = downscale(img_data, working_width / img_data.shape[1])
+        scale = img_data.shape[1] / width
+        min_size = _scale_size(self.min_size, scale)
+        max_size = _scale_size(self.max_size, scale)
+        if self.tile_size and max(img_data.shape[:2]) > self.tile_size:
+            faces = self._detect_tiled(img_data, min_size, max_size)
+        else:
+            faces = self._detect_multi_scale(img_data, min_size, max_size)
+        if scale < 1:
+            faces = rescale_faces(faces, height / img_data.shape[0],
+                                  width / img_data.shape[1])
+        if self.iou_threshold < 1:
+            faces = non_max_suppression(faces, self.iou_threshold)
+        return faces
+
+    def _detect_multi_scale(self, img_data, min_size, max_size):
+        return as_face_array(self.cascade.detect_multi_scale(
+            img=img_data,
+            scale_factor=self.scale_factor,
+            step_ratio=self.step_ratio,
+            min_size=min_size,
+            max_size=max_size
+        ))
+
+    def _detect_tiled(self, img_data, min_size, max_size):
+        """ Search overlapping tiles of the image, one after the other, and
+        merge the faces found.
+
+        Faces touching the edge of a tile inside the image may be cut: they
+        are dropped, since the overlap, larger than the largest face,
+        guarantees they are entirely inside a neighbouring tile without
+        touching its inner edges.
+        """
+        height, width = img_data.shape[:2]
+        overlap = max(max_size) + 1
+        tile_size = max(self.tile_size, 2 * overlap)
+        tiles_faces = []
+        for top in _tile_starts(height, tile_size, overlap):
+            for left in _tile_starts(width, tile_size, overlap):
+                tile_data = img_data[top:top + tile_size,
+                                     left:left + tile_size]
+                tiles_faces.append(self._detect_tile(
+                    tile_data, top, left, (height, width), min_size, max_size
+                ))
+        # Faces in the overlap between tiles are found several times
+        return non_max_suppression(np.concatenate(tiles_faces),
+                                   min(self.iou_threshold,
+                                       DEFAULT_IOU_THRESHOLD))
+
+    def _detect_tile(self, tile_data, top, left, shape, min_size, max_size):
+        """ Return the faces found in a tile starting at (top, left) of an
+        image of the provided shape, in image coordinates, without the faces
+        cut by the edges of the tile inside the image.
+        """
+        height, width = shape
+        faces = self._detect_multi_scale(tile_data, min_size, max_size)
+        bottom = top + tile_data.shape[0]
+        right = left + tile_data.shape[1]
+        cut = (
+            ((faces["r"] <= 0) & (top > 0)) |
+            ((faces["c"] <= 0) & (left > 0)) |
+            ((faces["r"] + faces["height"] >= tile_data.shape[0]) &
+             (bottom < height)) |
+            ((faces["c"] + faces["width"] >= tile_data.shape[1]) &
+             (right < width))
+        )
+        faces = faces[~cut]
+        faces["r"] += top
+        faces["c"] += left
+        return faces
+
+    def working_scale(self, shape):
+        """ Scale factor (at most 1) from an image of the provided shape to
+        the working resolution.
+        """
+        longest_side = max(shape[:2])
+        if not self.max_side or longest_side <= self.max_side:
+            return 1.
+        return self.max_side / longest_side
+
+    def _trained_file_default(self):
+        # Load the trained file from the module root.
+        return data.lbp_frontal_face_cascade_filename()
+
+    @cached_property
+    def _get_cascade(self):
+        return Cascade(self.trained_file)
+
+    def _get_key(self):
+        key = [
+            self.trained_file, self.scale_factor, self.step_ratio,
+            list(self.min_size), list(self.max_size)
+        ]
+        # Only mention the options that change the results, so results
+        # cached without them remain valid.
+        options = {}
+        if self.max_side:
+            options["max_side"] = self.max_side
+        if self.iou_threshold < 1:
+            options["iou_threshold"] = self.iou_threshold
+        if self.tile_size:
+            options["tile_size"] = self.tile_size
+        if options:
+            key.append(options)
+        return json.dumps(key)
+
+
+def get_face_detector(trained_file="", scale_factor=DEFAULT_SCALE_FACTOR,
+                      step_ratio=DEFAULT_STEP_RATIO, min_size=DEFAULT_MIN_SIZE,
+                      max_size=DEFAULT_MAX_SIZE, max_side=DEFAULT_MAX_SIDE,
+                      iou_threshold=DEFAULT_IOU_THRESHOLD,
+                      tile_size=DEFAULT_TILE_SIZE):
+    """ Return the current thread's detector for the provided parameters.
+
+    Detectors are built the first time a set of parameters is requested and
+    reused afterwards, so the cascade file is parsed once per thread (or
+    worker process) rather than once per image.
+    """
+    if not trained_file:
+        trained_file = data.lbp_frontal_face_cascade_filename()
+    key = (trained_file, float(scale_factor), float(step_ratio),
+           tuple(min_size), tuple(max_size), int(max_side),
+           float(iou_threshold), int(tile_size))
+
+    detectors = getattr(_registry, "detectors", None)
+    if detectors is None:
+        detectors = _registry.detectors = {}
+
+    if key not in detectors:
+        detectors[key] = FaceDetector(
+            trained_file=trained_file, scale_factor=scale_factor,
+            step_ratio=step_ratio, min_size=tuple(min_size),
+            max_size=tuple(max_size), max_side=max_side,
+            iou_threshold=iou_threshold, tile_size=tile_size
+        )
+    return detectors[key]
+
+
+def downscale(img_data, scale):
+    """ Resize an image array by a factor smaller than 1.
+    """
+    height, width = img_data.shape[:2]
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    img = PIL.Image.fromarray(img_data)
+    # Reduce by an integer factor first, which is much faster, then resample
+    return np.asarray(img.resize(size, PIL.Image.BILINEAR, reducing_gap=2.))
+
+
+def rescale_faces(faces, row_factor, col_factor):
+    """ Map faces found in a resized image back to the original image, given
+    the ratios between the original and resized image heights and widths.
+    """
+    faces = faces.copy()
+    for name, factor in [("r", row_factor), ("c", col_factor),
+                         ("width", col_factor), ("height", row_factor)]:
+        faces[name] = np.round(faces[name] * factor)
+    return faces
+
+
+def _scale_size(size, scale):
+    return tuple(max(1, int(round(side * scale))) for side in size)
+
+
+def _tile_starts(length, tile_size, overlap):
+    """ Start positions of the fewest tiles of tile_size covering length,
+    evenly spaced and overlapping by at least overlap.
+    """
+    if length <= tile_size:
+        return [0]
+    num_tiles = int(np.ceil((length - overlap) / (tile_size - overlap)))
+    return np.linspace(0, length - tile_size, num_tiles).astype(int).tolist()
@@ -0,0 +1,163 @@
+""" Compact storage for detected faces.
+
+Faces are stored in NumPy structured arrays, one 20 bytes record per face,
+so that counts, area filters and drawing are vectorized and a million
+detections fit in about 20 MB.
+"""
+# General imports
+import numpy as np
+
+#: Bounding box of a face, in pixels, and its detection score (NaN if the
+#: detector doesn't provide one)
+FACE_DTYPE = np.dtype([
+    ("r", np.int32), ("c", np.int32), ("width", np.int32),
+    ("height", np.int32), ("score", np.float32),
+])
+
+#: Faces of a folder: the face records plus the index of their image
+FOLDER_FACE_DTYPE = np.dtype(FACE_DTYPE.descr + [("image", np.int32)])
+
+BOX_FIELDS = ["r", "c", "width", "height"]
+
+#: Intersection over union above which two detections are considered to be
+#: the same face
+DEFAULT_IOU_THRESHOLD = 0.3
+
+
+def empty_faces():
+    """ Return an array holding no faces.
+    """
+    return np.empty(0, dtype=FACE_DTYPE)
+
+
+def as_face_array(faces):
+    """ Convert faces to a structured array of FACE_DTYPE.
+
+    Accepts a face array, a list of dicts with the r, c, width, height and
+    optional score keys (as returned by skimage's detect_multi_scale), or a
+    list of [r, c, width, height(, score)] sequences (as returned by
+    faces_to_list).
+    """
+    if isinstance(faces, np.ndarray) and faces.dtype == FACE_DTYPE:
+        return faces
+    rows = [
+        [face[key] for key in BOX_FIELDS] + [face.get("score")]
+        if isinstance(face, dict) else list(face) + [None] * (5 - len(face))
+        for face in faces
+    ]
+    array = np.empty(len(rows), dtype=FACE_DTYPE)
+    for name, column in zip(FACE_DTYPE.names, zip(*rows)):
+        array[name] = [np.nan if value is None else value for value in column]
+    return array
+
+
+def faces_to_list(faces):
+    """ Convert a face array to a list of [r, c, width, height, score] lists,
+    with None for missing scores, e.g. to serialize it to JSON.
+    """
+    return [
+        [int(r), int(c), int(width), int(height),
+         None if np.isnan(score) else float(score)]
+        for r, c, width, height, score in faces.tolist()
+    ]
+
+
+def concatenate_faces(faces_per_image):
+    """ Concatenate the face arrays of several images into one array of
+    FOLDER_FACE_DTYPE, recording the position of each face's image.
+    """
+    counts = [len(faces) for faces in faces_per_image]
+    folder_faces = np.empty(sum(counts), dtype=FOLDER_FACE_DTYPE)
+    if not faces_per_image:
+        return folder_faces
+    all_faces = np.concatenate(faces_per_image)
+    for name in FACE_DTYPE.names:
+        folder_faces[name] = all_faces[name]
+    folder_faces["image"] = np.repeat(np.arange(len(counts)), counts)
+    return folder_faces
+
+
+def non_max_suppression(faces, iou_threshold=DEFAULT_IOU_THRESHOLD):
+    """ Merge overlapping detections of the same face.
+
+    Faces are visited by decreasing score (or area, for faces without a
+    score), and each face kept suppresses all the remaining faces whose
+    intersection over union with it is larger than iou_threshold (between
+    0 and 1). Returns the faces kept, in their original order.
+
+    Only faces in neighbouring cells of a grid as large as the largest face
+    can overlap: their intersections over union are computed at once, and
+    only the pairs above the threshold are visited one at a time. This takes
+    O(n log n + k) for n faces and k such pairs, instead of O(n^2), as long
+    as the faces have similar sizes.
+    """
+    num_faces = len(faces)
+    if num_faces < 2:
+        return faces
+
+    top = faces["r"].astype(np.float64)
+    left = faces["c"].astype(np.float64)
+    bottom = top + faces["height"]
+    right = left + faces["width"]
+    areas = (bottom - top) * (right - left)
+    scores = np.where(np.isnan(faces["score"]), -np.inf, faces["score"])
+    # Rank by decreasing score, then decreasing area
+    rank = np.empty(num_faces, dtype=np.intp)
+    rank[np.lexsort((-areas, -scores))] = np.arange(num_faces)
+
+    first, second = _neighbour_pairs(
+        top, left, max(faces["height"].max(), 1), max(faces["width"].max(), 1)
+    )
+    heights = np.minimum(bottom[first], bottom[second]) - \
+        np.maximum(top[first], top[second])
+    widths = np.minimum(right[first], right[second]) - \
+        np.maximum(left[first], left[second])
+    intersections = np.clip(heights, 0, None) * np.clip(widths, 0, None)
+    unions = areas[first] + areas[second] - intersections
+    over = intersections > iou_threshold * unions
+    first, second = first[over], second[over]
+
+    # Visit the pairs by rank of their better face: whether it is kept is
+    # known once the pairs of the better faces were visited.
+    first_better = rank[first] < rank[second]
+    better = np.where(first_better, first, second)
+    worse = np.where(first_better, second, first)
+    visit = np.argsort(rank[better], kind="stable")
+    suppressed = np.zeros(num_faces, dtype=bool)
+    for idx, other in zip(better[visit].tolist(), worse[visit].tolist()):
+        if not suppressed[idx]:
+            suppressed[other] = True
+    return faces[~suppressed]
+
+
+def _neighbour_pairs(top, left, cell_height, cell_width):
+    """ Return the indices of the pairs of boxes whose top left corners are
+    in the same or neighbouring cells of the grid, each pair once.
+    """
+    rows = (top // cell_height).astype(np.int64)
+    cols = (left // cell_width).astype(np.int64)
+    rows -= rows.min()
+    cols -= cols.min()
+    # Padded by a column on each side, so that neighbours don't wrap
+    num_cols = cols.max() + 3
+    keys = rows * num_cols + cols + 1
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+
+    num_boxes = len(keys)
+    firsts, seconds = [], []
+    # Cells below and on the right: the other neighbours pair with these
+    for row_step, col_step in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        neighbour_keys = keys + row_step * num_cols + col_step
+        starts = np.searchsorted(keys, neighbour_keys, side="left")
+        ends = np.searchsorted(keys, neighbour_keys, side="right")
+        if row_step == col_step == 0:
+            # The following boxes of the same cell only
+            starts = np.maximum(starts, np.arange(1, num_boxes + 1))
+        counts = np.clip(ends - starts, 0, None)
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        firsts.append(np.repeat(order, counts))
+        seconds.append(order[np.repeat(starts, counts) + offsets])
+    return np.concatenate(firsts), np.concatenate(seconds)
@@ -0,0 +1,18 @@
+""" Signature of an image file, to tell whether it changed.
+"""
+# General imports
+import os
+
+
+def file_signature(filepath):
+    """ Return the (size, modification time in ns, inode) of a file, as in
+    directory listings, or None if it can't be accessed.
+
+    The size and modification time alone identify the file's content, e.g.
+    for cached results that outlive the file's inode.
+    """
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
@@ -0,0 +1,152 @@
+""" Watch a directory for changes to its image files.
+
+On Linux, changes to a directory are reported by inotify, through the
+optional inotify_simple package. Elsewhere, or when searching sub-directories,
+the image files are listed periodically and their signatures compared.
+"""
+# General imports
+from os.path import splitext
+import sys
+import time
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+# Local imports
+from pycasa.model.image_file import SUPPORTED_FORMATS
+
+#: Time between two checks for changes, in seconds
+POLL_INTERVAL = 2.0
+
+#: Time without any new change after which changes are reported, in seconds
+DEBOUNCE_DELAY = 1.0
+
+#: Maximum time before changes are reported while files keep changing, in
+#: seconds
+MAX_DELAY = 10.0
+
+#: Time to wait for more inotify events after the first one, in milliseconds
+INOTIFY_READ_DELAY = 100
+
+
+def inotify_available():
+    """ Whether changes can be reported by inotify rather than polling.
+    """
+    return inotify_simple is not None and sys.platform.startswith("linux")
+
+
+def iter_directory_changes(directory, list_image_files,
+                           poll_interval=POLL_INTERVAL,
+                           debounce=DEBOUNCE_DELAY, max_delay=MAX_DELAY,
+                           use_inotify=True):
+    """ Watch a directory for changes to its image files, forever.
+
+    Changes are debounced: the current list of image files is yielded once
+    no new change happened for debounce seconds, or max_delay seconds after
+    the first unreported change while files keep changing (e.g. while many
+    files are being copied), so that the watcher can be diffed against it
+    without listing the directory again. None is yielded after each
+    poll_interval without anything to report, so that the watch can be
+    stopped between yields.
+
+    Parameters
+    ----------
+    directory : str
+        Directory to watch.
+    list_image_files : callable
+        Function returning the list of (path, signature) pairs of the watched
+        image files, used to detect changes when polling, and to list them
+        when changes are reported.
+    use_inotify : bool
+        Whether to use inotify, if available, rather than polling. inotify
+        only watches the directory itself, not its sub-directories.
+    """
+    if use_inotify and inotify_available():
+        wait_for_changes = _InotifyWaiter(directory, list_image_files)
+    else:
+        wait_for_changes = _PollingWaiter(list_image_files)
+
+    with wait_for_changes:
+        first_change = last_change = None
+        while True:
+            timeout = poll_interval if first_change is None else debounce
+            changed = wait_for_changes(timeout)
+            now = time.monotonic()
+            if changed:
+                last_change = now
+                if first_change is None:
+                    first_change = now
+            if first_change is not None and (
+                now - last_change >= debounce or
+                now - first_change >= max_delay
+            ):
+                first_change = None
+                yield wait_for_changes.listing()
+            else:
+                yield None
+
+
+class _PollingWaiter:
+    """ Wait for changes by listing the image files again after a delay.
+    """
+    def __init__(self, list_image_files):
+        self.list_image_files = list_image_files
+        self.snapshot = list_image_files()
+
+    def __call__(self, timeout):
+        time.sleep(timeout)
+        snapshot = self.list_image_files()
+        changed = snapshot != self.snapshot
+        self.snapshot = snapshot
+        return changed
+
+    def listing(self):
+        """ Return the image files found by the last poll.
+        """
+        return self.snapshot
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class _InotifyWaiter:
+    """ Wait for inotify events on image files of a directory.
+    """
+    def __init__(self, directory, list_image_files):
+        self.list_image_files = list_image_files
+        flags = inotify_simple.flags
+        self.extensions = {fmt.lower() for fmt in SUPPORTED_FORMATS}
+        self.inotify = inotify_simple.INotify()
+        self.inotify.add_watch(
+            directory,
+            flags.CLOSE_WRITE | flags.CREATE | flags.DELETE | flags.ATTRIB |
+            flags.MOVED_FROM | flags.MOVED_TO | flags.DELETE_SELF |
+            flags.MOVE_SELF
+        )
+
+    def __call__(self, timeout):
+        # Wait a little after the first event to read bursts of events at
+        # once, e.g. when many files are copied.
+        events = self.inotify.read(timeout=int(timeout * 1000),
+                                   read_delay=INOTIFY_READ_DELAY)
+        return any(
+            not event.name or
+            splitext(event.name)[1].lower() in self.extensions
+            for event in events
+        )
+
+    def listing(self):
+        """ Return the image files currently in the directory.
+        """
+        return self.list_image_files()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.inotify.close()
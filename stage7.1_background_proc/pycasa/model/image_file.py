@@ -1,29 +1,61 @@
 # General imports
+from math import ceil
 from os.path import splitext
 import PIL.Image
-from PIL.ExifTags import TAGS
-from skimage import data
-from skimage.feature import Cascade
 import numpy as np
 
 # ETS imports
 from traits.api import (
-    Array, cached_property, Dict, File, HasStrictTraits, List, Property
+    Array, cached_property, Dict, File, HasStrictTraits, Instance, Int,
+    Property, Str, Tuple
 )
 
+# Local imports
+from pycasa.model.detection_cache import DetectionCache
+from pycasa.model.face_detector import get_face_detector
+from pycasa.model.faces import empty_faces, FACE_DTYPE
+from pycasa.model.file_signature import file_signature
+from pycasa.model.image_metadata import read_metadata
+from pycasa.model.pixel_cache import get_pixel_cache, PixelCache
+
 SUPPORTED_FORMATS = [".png", ".jpg", ".jpeg", ".PNG", ".JPG", ".JPEG"]
 
+#: Longest side below which no smaller display pyramid level is made
+PYRAMID_MIN_SIDE = 256
+
 
 class ImageFile(HasStrictTraits):
     """ Model to hold an image file.
     """
     filepath = File
 
+    #: (size, modification time in ns, inode) of the file when it was
+    #: listed, if known
+    signature = Tuple
+
     metadata = Property(Dict, depends_on="filepath")
 
+    #: Decoded pixels, kept in the pixel cache rather than by the image file
     data = Property(Array, depends_on="filepath")
 
-    faces = List
+    #: (height, width) of the full resolution image, read from its header
+    shape = Property(Tuple, depends_on="filepath")
+
+    #: PIL mode of the image (e.g. "RGB", "P"), read from its header
+    mode = Property(Str, depends_on="filepath")
+
+    #: Number of levels of the display pyramid (see pyramid_level)
+    num_pyramid_levels = Property(Int, depends_on="filepath")
+
+    #: Faces found by the last detection, as an array of FACE_DTYPE
+    faces = Array(dtype=FACE_DTYPE, shape=(None,), value=empty_faces())
+
+    #: Persistent cache of face detection results, if any
+    detection_cache = Instance(DetectionCache)
+
+    #: Cache of decoded pixel arrays. Defaults to the cache shared by all
+    #: image files.
+    pixel_cache = Instance(PixelCache)
 
     def _is_valid_file(self):
         return (
@@ -31,34 +63,186 @@ class ImageFile(HasStrictTraits):
             splitext(self.filepath)[1].lower() in SUPPORTED_FORMATS
         )
 
-    @cached_property
     def _get_data(self):
         if not self._is_valid_file():
             return np.array([])
+        return self._cached_pixels("data", 0, self._decode)
+
+    @cached_property
+    def _get_shape(self):
+        if not self._is_valid_file():
+            return (0,)
+        with PIL.Image.open(self.filepath) as img:
+            return (img.height, img.width)
+
+    @cached_property
+    def _get_mode(self):
+        if not self._is_valid_file():
+            return ""
+        with PIL.Image.open(self.filepath) as img:
+            return img.mode
+
+    def data_at(self, max_side):
+        """ Return the image data reduced for a longest side of about
+        max_side pixels.
+
+        JPEG files are decoded directly at 1/2, 1/4 or 1/8 of their size by
+        libjpeg, using the smallest scale keeping the longest side at least
+        max_side, which is several times faster than a full decode and needs
+        a fraction of the memory. Other files are decoded at full resolution.
+        The result is cached separately from data.
+        """
+        if not self._is_valid_file():
+            return self.data
+        is_jpeg = splitext(self.filepath)[1].lower() in {".jpg", ".jpeg"}
+        if not is_jpeg or max(self.shape) <= max_side:
+            # Nothing to gain: share the full resolution data
+            return self.data
+        return self._cached_pixels(
+            "reduced", max_side, lambda: self._decode(max_side=max_side)
+        )
+
+    def pyramid_level(self, level):
+        """ Return the image data reduced by a factor 2**level, to display
+        the image at a fraction of its resolution.
+
+        Levels are decoded lazily and cached separately from data: JPEG
+        files are decoded directly at 1/2, 1/4 or 1/8 of their size by
+        libjpeg, and further reduced by averaging blocks of pixels, as are
+        other files. Palette, bilevel and 16 bits images, whose pixels can't
+        be averaged, are converted to RGB(A), grayscale and 32 bits images
+        first, at all levels. Otherwise, level 0 is data.
+        """
+        if not self._is_valid_file():
+            return self.data
+        if level == 0 and _display_mode(self.mode) is None:
+            return self.data
+        return self._cached_pixels(
+            "pyramid", level, lambda: self._decode_level(level)
+        )
+
+    @cached_property
+    def _get_num_pyramid_levels(self):
+        if not self._is_valid_file():
+            return 1
+        # Smallest level with a longest side of at least PYRAMID_MIN_SIDE
+        ratio = max(self.shape) / PYRAMID_MIN_SIDE
+        return 1 + int(np.log2(max(ratio, 1)))
+
+    def detection_data(self, max_side=0, keep_pixels=True):
+        """ Return the image as a contiguous uint8 grayscale array to detect
+        faces in, and the shape of the full resolution image.
+
+        The image is converted while it is decoded: JPEG files are decoded
+        straight to grayscale, reduced as for data_at(max_side) if max_side
+        is provided, and other files are converted by PIL. No color or float
+        copy of the pixels is made. The result is cached separately from
+        data, unless keep_pixels is False.
+        """
+        if not self._is_valid_file():
+            return np.array([], dtype=np.uint8), (0,)
+        data = self._cached_pixels(
+            "gray", max_side,
+            lambda: self._decode(max_side=max_side, mode="L"),
+            keep_pixels=keep_pixels
+        )
+        return data, self.shape
+
+    def _cached_pixels(self, kind, max_side, decode, keep_pixels=True):
+        """ Return the pixels of the given kind from the pixel cache, calling
+        decode() if they aren't cached, and caching them if keep_pixels.
+
+        Cached pixels are keyed on the file's signature, read from the file
+        when not known from a directory listing, so that the pixels of a
+        modified file are decoded again.
+        """
+        signature = tuple(self.signature) or file_signature(self.filepath)
+        key = (self.filepath, signature, kind, max_side)
+        return self.pixel_cache.get(key, decode, store=keep_pixels)
+
+    def _decode(self, max_side=0, mode=None):
+        """ Decode the image, converted to mode if provided, and reduced for
+        a longest side of at least max_side if it's a JPEG file.
+        """
+        with PIL.Image.open(self.filepath) as img:
+            _draft(img, mode or img.mode, max_side)
+            if mode and img.mode != mode:
+                img = img.convert(mode)
+            return np.asarray(img)
+
+    def _decode_level(self, level):
+        """ Decode the image reduced by a factor 2**level.
+        """
+        factor = 2 ** level
         with PIL.Image.open(self.filepath) as img:
+            full_side = max(img.size)
+            _draft(img, img.mode, ceil(full_side / factor))
+            mode = _display_mode(img.mode, "transparency" in img.info)
+            if mode is not None:
+                img = img.convert(mode)
+            # Reduce what the JPEG decoder didn't
+            remaining = round(factor * max(img.size) / full_side)
+            if remaining > 1:
+                img = img.reduce(remaining)
             return np.asarray(img)
 
+    def _pixel_cache_default(self):
+        return get_pixel_cache()
+
     @cached_property
     def _get_metadata(self):
         if not self._is_valid_file():
             return {}
-        with PIL.Image.open(self.filepath) as img:
-            exif = img._getexif()
-        if not exif:
-            return {}
-        return {TAGS[k]: v for k, v in exif.items() if k in TAGS}
+        # Only parses the file header: pixels are never decoded.
+        return read_metadata(self.filepath)
+
+    def detect_faces(self, keep_pixels=True, **kwargs):
+        """ Detect faces in the image, using the shared detector matching the
+        provided detection parameters (see get_face_detector).
 
-    def detect_faces(self):
-        # Load the trained file from the module root.
-        trained_file = data.lbp_frontal_face_cascade_filename()
+        Results are looked up in and stored to the detection cache if any.
+        With keep_pixels=False, pixels decoded for the detection are
+        released as soon as it's done instead of being kept in the pixel
+        cache.
+        """
+        detector = get_face_detector(**kwargs)
+        use_cache = self.detection_cache is not None and self._is_valid_file()
 
-        # Initialize the detector cascade.
-        detector = Cascade(trained_file)
+        faces = None
+        if use_cache:
+            faces = self.detection_cache.get(self.filepath, detector)
+        if faces is None:
+            # No need to decode more pixels than the detector uses
+            img_data, shape = self.detection_data(detector.max_side,
+                                                  keep_pixels=keep_pixels)
+            faces = detector.detect(img_data, shape=shape)
+            if use_cache:
+                self.detection_cache.set(self.filepath, detector, faces)
 
-        detected = detector.detect_multi_scale(img=self.data,
-                                               scale_factor=1.2,
-                                               step_ratio=1,
-                                               min_size=(60, 60),
-                                               max_size=(600, 600))
-        self.faces = detected
+        self.faces = faces
         return self.faces
+
+
+def _display_mode(mode, transparency=False):
+    """ Return the mode to convert images of the provided mode to so their
+    pixels can be averaged, or None if they can be as is.
+    """
+    if mode in {"P", "PA"}:
+        return "RGBA" if transparency or mode == "PA" else "RGB"
+    if mode == "1":
+        return "L"
+    if mode.startswith("I;16"):
+        return "I"
+    return None
+
+
+def _draft(img, mode, max_side=0):
+    """ Configure a JPEG image to be decoded in the provided mode, at the
+    smallest DCT scale keeping its longest side at least max_side (full size
+    if 0). Has no effect on other formats.
+    """
+    size = None
+    if max_side and max(img.size) > max_side:
+        scale = max_side / max(img.size)
+        size = (ceil(img.width * scale), ceil(img.height * scale))
+    img.draft(mode, size)
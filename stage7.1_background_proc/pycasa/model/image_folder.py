@@ -1,42 +1,191 @@
 # General imports
-import glob
-from os.path import basename, expanduser, isdir
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+)
+from contextlib import closing
+from fnmatch import fnmatch
+import multiprocessing
+from operator import attrgetter
+import os
+from os.path import basename, expanduser, isdir, relpath, splitext
+import time
 
 import numpy as np
 import pandas as pd
 
 # ETS imports
 from traits.api import (
-    Bool, Directory, Event, HasStrictTraits, Instance, List, observe, Property
+    Bool, ComparisonMode, Dict, Directory, Event, Float, HasStrictTraits,
+    Instance, Int, List, observe, Property, Str, Union
 )
 from traits_futures.api import (
-    CallFuture, submit_call, TraitsExecutor
+    CallFuture, COMPLETED, IterationFuture, submit_call, submit_iteration,
+    TraitsExecutor
 )
 
 # Local imports
+from pycasa.model.batch_detection import (
+    DEFAULT_CHUNK_SIZE, iter_detect_faces_batch
+)
+from pycasa.model.detection_cache import DetectionCache
+from pycasa.model.face_detector import get_face_detector
+from pycasa.model.faces import concatenate_faces
+from pycasa.model.folder_watcher import (
+    DEBOUNCE_DELAY, iter_directory_changes, POLL_INTERVAL
+)
 from pycasa.model.image_file import ImageFile, SUPPORTED_FORMATS
 
 FILENAME_COL = "filename"
+RELPATH_COL = "Relative path"
 NUM_FACE_COL = "Num. faces"
 
+#: Number of image files read concurrently when extracting metadata
+METADATA_MAX_WORKERS = 8
+
+#: Number of image files whose metadata is read between two checks for
+#: cancellation when loading it in the background
+METADATA_BATCH_SIZE = 64
+
+#: Number of directories listed concurrently when searching sub-directories
+LISTING_MAX_WORKERS = 8
+
+#: Minimum number of image files found before they are added to the folder
+LISTING_BATCH_SIZE = 1000
+
+#: Number of image files sent at once to a worker process by parallel
+#: background scans. Results are yielded, and cancellation checked, a chunk
+#: at a time, so cancelling waits for the chunks being searched.
+SCAN_CHUNK_SIZE = 1
+
+#: Start method of the face detection worker processes. Forking from a
+#: worker thread of a GUI application (e.g. a background scan) can deadlock
+#: the children on locks held by other threads.
+MP_START_METHOD = "spawn"
+
+
+class RowsChange(HasStrictTraits):
+    """ Description of the rows of an image folder's data changed in place.
+    """
+    #: Paths of the image files whose rows were added at the end of the data
+    added = List(Str)
+
+    #: Paths of the image files whose rows were removed from the data
+    removed = List(Str)
+
+    #: Paths of the image files whose rows were updated
+    updated = List(Str)
+
 
 class ImageFolder(HasStrictTraits):
     """ Model for a folder of images.
     """
     directory = Directory(expanduser("~"))
 
-    images = List(Instance(ImageFile))
+    #: Whether to also look for images in sub-directories
+    recursive = Bool
+
+    #: Maximum depth of sub-directories searched, None for no limit
+    max_depth = Union(None, Int)
+
+    #: Glob patterns for image paths, relative to the directory, to include.
+    #: All images are included if empty. Applies to flat folders too.
+    include = List(Str)
+
+    #: Glob patterns for image and sub-directory paths, relative to the
+    #: directory, to skip. Applies to flat folders too.
+    exclude = List(Str)
+
+    # Notify on every assignment, even of an equal (e.g. empty) list, so the
+    # data is always rebuilt.
+    images = List(Instance(ImageFile), comparison_mode=ComparisonMode.identity)
 
     data = Instance(pd.DataFrame)
 
-    data_updated = Event
+    #: Fired with the positions of the rows whose face counts were updated,
+    #: in place, by a face scan
+    data_updated = Event(List(Int))
+
+    #: Fired with a RowsChange when rows of the data are added, removed or
+    #: updated, e.g. by refresh. data is also fired when rows are appended,
+    #: since they are appended to a new DataFrame.
+    rows_changed = Event(Instance(RowsChange))
+
+    #: Persistent cache of face detection results, if any
+    detection_cache = Instance(DetectionCache)
 
     traits_executor = Instance(TraitsExecutor)
 
-    future = Instance(CallFuture)
+    #: Whether the images' metadata is being read in the background
+    loading_metadata = Bool
+
+    #: Whether sub-directories are being searched for images in the
+    #: background
+    listing_images = Bool
+
+    listing_future = Instance(IterationFuture)
+
+    metadata_future = Instance(IterationFuture)
+
+    #: Future reading the metadata of the rows added or updated by refresh
+    rows_metadata_future = Instance(CallFuture)
+
+    future = Instance(IterationFuture)
 
     executor_idle = Property(Bool, depends_on="future.done")
 
+    #: Number of images to process in the current face scan
+    num_to_scan = Int
+
+    #: Number of images processed so far by the current face scan
+    num_scanned = Int
+
+    #: Estimated time left for the current face scan, in seconds
+    scan_eta = Float
+
+    #: Whether to watch the directory and refresh the images and data when
+    #: image files change. Requires a traits executor.
+    watch = Bool
+
+    #: Whether to scan the images added or modified while watching for faces
+    auto_scan = Bool
+
+    #: Time between two checks for changes while watching, in seconds
+    watch_interval = Float(POLL_INTERVAL)
+
+    #: Time without new changes before the images and data are refreshed
+    #: while watching, in seconds
+    watch_debounce = Float(DEBOUNCE_DELAY)
+
+    watch_future = Instance(IterationFuture)
+
+    #: Time at which the current face scan started
+    _scan_start = Float
+
+    #: Images searched by the current face scan, by index, to drop the
+    #: results of those replaced by refresh since
+    _scan_images = Dict
+
+    #: Image files listed when changes were detected while the directory was
+    #: being listed or the metadata loaded, to refresh the data with once it
+    #: is complete
+    _pending_image_files = Union(None, List)
+
+    #: Metadata read so far by metadata_future, by image
+    _metadata_read = List
+
+    #: Images whose metadata is read by rows_metadata_future
+    _rows_metadata_images = List(Instance(ImageFile))
+
+    #: Whether to scan the images left to scan once the current scan is done,
+    #: or once the images are listed and their metadata loaded
+    _scan_pending = Bool
+
+    #: Parameters of the last face scan requested, used by pending scans
+    _scan_kwargs = Dict
+
+    #: Whether the images and data are being updated together by refresh
+    _refreshing = Bool
+
     def __init__(self, **traits):
         # Don't forget this!
         super(ImageFolder, self).__init__(**traits)
@@ -44,52 +193,645 @@ class ImageFolder(HasStrictTraits):
             msg = f"The provided directory isn't a real directory: " \
                   f"{self.directory}"
             raise ValueError(msg)
-        self.data = self._create_metadata_df()
+        self._update_images(None)
+        self._update_watch(None)
 
-    @observe("directory")
+    @observe("directory, recursive, max_depth, include.items, exclude.items",
+             post_init=True)
     def _update_images(self, event):
-        self.images = [
-            ImageFile(filepath=file)
-            for fmt in SUPPORTED_FORMATS
-            for file in glob.glob(f"{self.directory}/*{fmt}")
+        if self.listing_future is not None and self.listing_future.cancellable:
+            self.listing_future.cancel()
+        self.listing_images = False
+        # The metadata being read is for the previous images
+        self.cancel_metadata()
+        self.metadata_future = self.rows_metadata_future = None
+
+        if not isdir(self.directory):
+            self.images = []
+        elif self.recursive and self.traits_executor is not None:
+            # Images are added to the folder in batches as they are found,
+            # and their metadata is loaded once the search is complete.
+            self.listing_images = True
+            self.loading_metadata = True
+            self.images = []
+            self.data = self._create_metadata_df([])
+            self.listing_future = submit_iteration(
+                self.traits_executor,
+                self._iter_image_files
+            )
+        else:
+            self.images = self._create_images(self._list_image_files())
+
+    def refresh(self, image_files=None):
+        """ Update the images and data with the changes made to the image
+        files since the directory was listed.
+
+        Only the rows of image files added, removed or modified (based on
+        their size, modification time and inode) are changed, in place, and
+        rows_changed is fired (and data too if rows are appended). Face counts
+        of unchanged images are kept. A running face scan is cancelled if
+        rows are removed, since the following rows move, and its results for
+        modified images are dropped. With a traits executor, the metadata of
+        the added and modified image files is read in the background, and
+        rows_changed is fired again for their rows once it is available.
+
+        Returns the RowsChange, or None if nothing changed, or if the images
+        are being listed or their metadata loaded, since rows can't be changed
+        in place until the data is complete.
+
+        Parameters
+        ----------
+        image_files : list, optional
+            Current (path, signature) pairs of the image files, e.g. as
+            reported by the folder watcher. The directory is listed if None.
+        """
+        if not isdir(self.directory) or self.listing_images or \
+                self.loading_metadata:
+            return None
+
+        if image_files is None:
+            image_files = self._list_image_files()
+        listed = dict(image_files)
+        known = {img.filepath for img in self.images}
+        removed = [
+            idx for idx, img in enumerate(self.images)
+            if img.filepath not in listed
+        ]
+        updated = [
+            idx for idx, img in enumerate(self.images)
+            if img.filepath in listed and
+            tuple(img.signature) != listed[img.filepath]
+        ]
+        added_images = self._create_images(
+            (filepath, signature) for filepath, signature in listed.items()
+            if filepath not in known
+        )
+        if not (removed or updated or added_images):
+            return None
+        if removed:
+            self.cancel_scan()
+
+        change = RowsChange(
+            added=[img.filepath for img in added_images],
+            removed=[self.images[idx].filepath for idx in removed],
+            updated=[self.images[idx].filepath for idx in updated],
+        )
+        self._refreshing = True
+        try:
+            self._update_rows(updated, listed)
+            self._remove_rows(removed)
+            self._add_rows(added_images)
+        finally:
+            self._refreshing = False
+        self.rows_changed = change
+
+        if self.traits_executor is not None:
+            new_paths = set(change.added) | set(change.updated)
+            self._rows_metadata_images = [
+                img for img in self.images if img.filepath in new_paths
+            ]
+            self.loading_metadata = True
+            self.rows_metadata_future = submit_call(
+                self.traits_executor,
+                read_images_metadata,
+                list(self._rows_metadata_images)
+            )
+        return change
+
+    def _update_rows(self, indices, listed):
+        """ Replace the images at the provided indices with new ones, using
+        their listed signatures, and update their rows.
+        """
+        if not indices:
+            return
+        new_images = self._create_images(
+            (self.images[idx].filepath, listed[self.images[idx].filepath])
+            for idx in indices
+        )
+        for idx, img in zip(indices, new_images):
+            self.images[idx] = img
+        new_rows = self._create_rows(new_images)
+        for column in new_rows.columns.difference(self.data.columns):
+            self.data[column] = np.nan
+        new_rows = new_rows.reindex(columns=self.data.columns)
+        new_rows.index = self.data.index[indices]
+        self.data.loc[new_rows.index] = new_rows
+
+    def _remove_rows(self, indices):
+        if not indices:
+            return
+        for idx in reversed(indices):
+            del self.images[idx]
+        self.data.drop(self.data.index[indices], inplace=True)
+        self.data.reset_index(drop=True, inplace=True)
+
+    def _add_rows(self, new_images):
+        if not new_images:
+            return
+        self.images.extend(new_images)
+        # Appended at once: enlarging the data a row at a time copies it for
+        # each row.
+        self.data = pd.concat(
+            [self.data, self._create_rows(new_images)], ignore_index=True
+        )
+
+    def _create_rows(self, images):
+        """ Return the rows of the images' data. With a traits executor, the
+        metadata is left empty, to be read in the background.
+        """
+        if self.traits_executor is None:
+            metadata = read_images_metadata(images)
+        else:
+            metadata = [{}] * len(images)
+        return self._create_metadata_df(metadata, images=images)
+
+    def _list_image_files(self):
+        """ List the image files synchronously, sorted by path.
+        """
+        if not (self.recursive or self.include or self.exclude):
+            return list_image_files(self.directory)
+        return sorted(
+            image_file
+            for batch in self._iter_image_files()
+            for image_file in batch
+        )
+
+    def _iter_image_files(self):
+        return iter_image_files(
+            self.directory,
+            max_depth=self.max_depth if self.recursive else 0,
+            include=list(self.include), exclude=list(self.exclude)
+        )
+
+    def _create_images(self, image_files):
+        return [
+            ImageFile(filepath=filepath, signature=signature,
+                      detection_cache=self.detection_cache)
+            for filepath, signature in image_files
         ]
 
-    @observe("images.items")
+    @observe("watch, directory, recursive, max_depth, include.items, "
+             "exclude.items, traits_executor", post_init=True)
+    def _update_watch(self, event):
+        if self.watch_future is not None and self.watch_future.cancellable:
+            self.watch_future.cancel()
+        self.watch_future = None
+        if not (self.watch and self.traits_executor is not None and
+                isdir(self.directory)):
+            return
+        # inotify doesn't report changes in sub-directories: poll instead.
+        self.watch_future = submit_iteration(
+            self.traits_executor,
+            iter_directory_changes,
+            self.directory,
+            self._list_image_files,
+            poll_interval=self.watch_interval,
+            debounce=self.watch_debounce,
+            use_inotify=not self.recursive,
+        )
+
+    @observe("watch_future:result_event")
+    def _directory_changed(self, event):
+        if event.new is not None:
+            self._apply_directory_changes(event.new)
+
+    def _apply_directory_changes(self, image_files):
+        """ Refresh the images and data with the image files listed by the
+        watcher, and scan the new images if requested.
+        """
+        if self.listing_images or self.loading_metadata:
+            # Rows can't be updated in place yet: try again once the data is
+            # complete.
+            self._pending_image_files = image_files
+            return
+        self._pending_image_files = None
+        self.refresh(image_files)
+        if not self.auto_scan or not self.data[NUM_FACE_COL].isna().any():
+            return
+        self._scan_kwargs["resume"] = True
+        self._scan_pending = True
+        self._start_pending_scan()
+
+    @observe("listing_future:result_event")
+    def _add_listed_images(self, event):
+        new_images = self._create_images(event.new)
+        self.images.extend(new_images)
+        new_data = self._create_metadata_df([{}] * len(new_images),
+                                            images=new_images)
+        self.data = pd.concat([self.data, new_data], ignore_index=True)
+
+    @observe("listing_future:done")
+    def _listing_done(self, event):
+        self.listing_images = False
+        if self.listing_future.state == COMPLETED:
+            self.images = sorted(self.images, key=attrgetter("filepath"))
+        else:
+            self.loading_metadata = False
+
+    @observe("detection_cache")
+    def _update_images_detection_cache(self, event):
+        for img in self.images:
+            img.detection_cache = self.detection_cache
+
+    @observe("images.items", post_init=True)
     def _update_metadata(self, event):
-        self.data = self._create_metadata_df()
+        if self.listing_images or self._refreshing:
+            # Rows are added or updated along with the images
+            return
+        self._load_metadata()
+
+    def _load_metadata(self):
+        """ Build the data from the images' metadata.
+
+        With a traits executor, the metadata is read in the background: the
+        data only contains filenames until it is available.
+        """
+        if self.traits_executor is None:
+            self.data = self._create_metadata_df(
+                read_images_metadata(self.images)
+            )
+            return
+
+        self.cancel_metadata()
+        self.data = self._create_metadata_df([{}] * len(self.images))
+        self.loading_metadata = True
+        self._metadata_read = []
+        self.metadata_future = submit_iteration(
+            self.traits_executor,
+            iter_images_metadata,
+            list(self.images)
+        )
+
+    def cancel_metadata(self):
+        """ Stop reading the images' metadata in the background, if it is
+        being read, after the current batch of images. The data then only
+        contains filenames.
+        """
+        for future in [self.metadata_future, self.rows_metadata_future]:
+            if future is not None and future.cancellable:
+                future.cancel()
+
+    @observe("metadata_future:result_event")
+    def _metadata_batch_read(self, event):
+        self._metadata_read.extend(event.new)
+
+    @observe("metadata_future:done")
+    def _metadata_loaded(self, event):
+        metadata_all_images, self._metadata_read = self._metadata_read, []
+        if self.metadata_future.state == COMPLETED:
+            data = self._create_metadata_df(metadata_all_images)
+            # Keep the face counts found while the metadata was loading
+            data[NUM_FACE_COL] = self.data[NUM_FACE_COL].fillna(
+                data[NUM_FACE_COL]
+            )
+            self.data = data
+        self._data_complete()
+
+    @observe("rows_metadata_future:done")
+    def _rows_metadata_loaded(self, event):
+        future = self.rows_metadata_future
+        images = self._rows_metadata_images
+        self._rows_metadata_images = []
+        if future.state == COMPLETED:
+            self._set_rows_metadata(images, future.result)
+        self._data_complete()
+
+    def _set_rows_metadata(self, images, metadata_all_images):
+        """ Fill the metadata columns of the images' rows, in place, and fire
+        rows_changed for them.
+        """
+        positions = {id(img): idx for idx, img in enumerate(self.images)}
+        rows = [
+            (positions[id(img)], metadata)
+            for img, metadata in zip(images, metadata_all_images)
+            if id(img) in positions
+        ]
+        if not rows:
+            return
+        indices, metadata_all_images = zip(*rows)
+        metadata = pd.DataFrame(list(metadata_all_images),
+                                index=self.data.index[list(indices)])
+        for column in metadata.columns.difference(self.data.columns):
+            self.data[column] = np.nan
+        if len(metadata.columns):
+            self.data.loc[metadata.index, metadata.columns] = metadata
+        self.rows_changed = RowsChange(
+            updated=[self.images[idx].filepath for idx in indices]
+        )
 
-    def _create_metadata_df(self):
-        if not self.images:
-            return pd.DataFrame({FILENAME_COL: [], NUM_FACE_COL: []})
+    def _data_complete(self):
+        """ Apply the changes and start the scan requested while the data was
+        incomplete, if any.
+        """
+        self.loading_metadata = False
+        if self._pending_image_files is not None:
+            self._apply_directory_changes(self._pending_image_files)
+        self._start_pending_scan()
+
+    def _create_metadata_df(self, metadata_all_images, images=None):
+        if images is None:
+            images = self.images
+        if not images:
+            return pd.DataFrame(
+                {FILENAME_COL: [], RELPATH_COL: [], NUM_FACE_COL: []}
+            )
+        num_faces_all_images = self._restore_cached_faces(images)
         return pd.DataFrame([
                 {
                     FILENAME_COL: basename(img.filepath),
-                    NUM_FACE_COL: np.nan,
-                    **img.metadata
-
+                    RELPATH_COL: relpath(img.filepath, self.directory),
+                    NUM_FACE_COL: num_faces,
+                    **metadata
                 }
-                for img in self.images
+                for img, num_faces, metadata in zip(
+                    images, num_faces_all_images, metadata_all_images
+                )
         ])
 
-    def compute_num_faces_background(self, **kwargs):
-        self.future = submit_call(
-            self.traits_executor,
-            self._compute_num_faces,
-            **kwargs
+    def _restore_cached_faces(self, images):
+        """ Set the faces of the images found by previous scans with the
+        default detector, and return their numbers of faces, NaN for the
+        images not scanned yet.
+        """
+        if self.detection_cache is None:
+            return [np.nan] * len(images)
+        cached = self.detection_cache.get_many(
+            [img.filepath for img in images], get_face_detector(),
+            signatures=[img.signature for img in images]
         )
+        num_faces = []
+        for img, faces in zip(images, cached):
+            if faces is None:
+                num_faces.append(np.nan)
+            else:
+                img.faces = faces
+                num_faces.append(len(faces))
+        return num_faces
 
-    def _compute_num_faces(self, **kwargs):
-        return [
-            len(img_file.detect_faces(**kwargs))
-            for img_file in self.images
+    def all_faces(self):
+        """ Return the faces found in all the images as a single array of
+        FOLDER_FACE_DTYPE, whose image field is the index of the image.
+        """
+        return concatenate_faces([img.faces for img in self.images])
+
+    def compute_num_faces_background(self, parallel=False, max_workers=None,
+                                     chunk_size=SCAN_CHUNK_SIZE,
+                                     resume=False, **kwargs):
+        """ Detect faces in all images without blocking the GUI thread.
+
+        Face counts are pushed to the data as soon as each image (or chunk
+        of images) is processed. With parallel=True, images are fanned out
+        to a pool of max_workers processes (all CPU cores by default) in
+        chunks of chunk_size files. With resume=True, images whose number of
+        faces is already known are skipped.
+
+        Images are searched by iter_detect_faces_batch, which decodes the
+        next images while the current one is searched, and releases their
+        pixels once searched, so memory use doesn't grow with the number of
+        images.
+
+        The scan can be interrupted between images (chunks of images in
+        parallel) with cancel_scan, without waiting for the images queued for
+        the worker processes. A scan
+        requested while the images are listed or their metadata loaded
+        starts once the data is complete.
+        """
+        self._scan_kwargs = dict(
+            parallel=parallel, max_workers=max_workers,
+            chunk_size=chunk_size, resume=resume, **kwargs
+        )
+        if self.listing_images or self.loading_metadata:
+            self._scan_pending = True
+            return
+
+        if resume:
+            indices = np.flatnonzero(self.data[NUM_FACE_COL].isna()).tolist()
+        else:
+            indices = list(range(len(self.images)))
+
+        self.num_to_scan = len(indices)
+        self.num_scanned = 0
+        self.scan_eta = 0.
+        self._scan_start = time.time()
+        images = [self.images[idx] for idx in indices]
+        self._scan_images = dict(zip(indices, images))
+        if parallel:
+            self.future = submit_iteration(
+                self.traits_executor,
+                iter_faces_parallel,
+                images,
+                indices=indices,
+                max_workers=max_workers,
+                chunk_size=chunk_size,
+                **kwargs
+            )
+        else:
+            self.future = submit_iteration(
+                self.traits_executor,
+                _iter_faces_with_indices,
+                iter_detect_faces_batch(images, **kwargs),
+                indices
+            )
+
+    def cancel_scan(self):
+        """ Stop the current face scan, if any, after the image(s) currently
+        being processed.
+        """
+        self._scan_pending = False
+        if self.future is not None and self.future.cancellable:
+            self.future.cancel()
+
+    @observe("future:result_event")
+    def _update_data(self, event):
+        col = self.data.columns.get_loc(NUM_FACE_COL)
+        # Images replaced by refresh since the scan started keep no count:
+        # the result is for the file as it was.
+        updated = [
+            (idx, faces) for idx, faces in event.new
+            if self.images[idx] is self._scan_images[idx]
         ]
+        for idx, faces in updated:
+            self.images[idx].faces = faces
+            self.data.iat[idx, col] = len(faces)
+
+        self.num_scanned += len(event.new)
+        elapsed = time.time() - self._scan_start
+        num_left = self.num_to_scan - self.num_scanned
+        self.scan_eta = elapsed / self.num_scanned * num_left
+        if updated:
+            self.data_updated = [idx for idx, _ in updated]
 
     @observe("future:done")
-    def _update_data(self, event):
-        num_faces_all_images = self.future.result
-        for idx, num_faces in enumerate(num_faces_all_images):
-            self.data[NUM_FACE_COL].iat[idx] = num_faces
-        self.data_updated = True
+    def _scan_done(self, event):
+        # Images were added while watching during the scan
+        self._start_pending_scan()
+
+    def _start_pending_scan(self):
+        """ Start the face scan requested, if any, once the data is complete
+        and the current scan done.
+        """
+        if not self._scan_pending or not self.executor_idle or \
+                self.listing_images or self.loading_metadata:
+            return
+        self._scan_pending = False
+        self.compute_num_faces_background(**self._scan_kwargs)
 
     def _get_executor_idle(self):
         return self.future is None or self.future.done
+
+
+def list_image_files(directory):
+    """ List the supported image files in a directory, in a single pass.
+
+    Extensions are matched case-insensitively. Returns a list of (path,
+    (size, modification time in ns, inode)) pairs, sorted by path.
+    """
+    return sorted(_scan_directory(directory)[0])
+
+
+def iter_image_files(directory, max_depth=None, include=(), exclude=(),
+                     max_workers=LISTING_MAX_WORKERS,
+                     batch_size=LISTING_BATCH_SIZE):
+    """ Search a directory and its sub-directories for image files.
+
+    Directories are listed concurrently by a pool of max_workers threads, up
+    to max_depth levels below the directory (no limit if None). Image paths
+    relative to the directory must match one of the include glob patterns,
+    if any, and image and sub-directory paths must match none of the exclude
+    patterns.
+
+    Image files are yielded in batches of at least batch_size (except for
+    the last one) of (path, (size, modification time in ns, inode)) pairs,
+    in the order directories are listed.
+    """
+    def is_excluded(path):
+        rel_path = relpath(path, directory).replace(os.sep, "/")
+        return any(fnmatch(rel_path, pattern) for pattern in exclude)
+
+    def is_included(path):
+        rel_path = relpath(path, directory).replace(os.sep, "/")
+        return not include or any(
+            fnmatch(rel_path, pattern) for pattern in include
+        )
+
+    batch = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(_scan_directory, directory): 0}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    depth = pending.pop(future)
+                    image_files, sub_directories = future.result()
+                    batch.extend(
+                        image_file for image_file in image_files
+                        if is_included(image_file[0]) and
+                        not is_excluded(image_file[0])
+                    )
+                    if max_depth is not None and depth >= max_depth:
+                        continue
+                    for sub_directory in sub_directories:
+                        if not is_excluded(sub_directory):
+                            future = executor.submit(_scan_directory,
+                                                     sub_directory)
+                            pending[future] = depth + 1
+
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        finally:
+            for future in pending:
+                future.cancel()
+
+    if batch:
+        yield batch
+
+
+def _scan_directory(directory):
+    """ Return the image files, with their (size, mtime, inode) signature,
+    and the sub-directories of a directory.
+    """
+    extensions = {fmt.lower() for fmt in SUPPORTED_FORMATS}
+    image_files = []
+    sub_directories = []
+    try:
+        entries = os.scandir(directory)
+    except OSError:
+        # e.g. permission denied on a sub-directory
+        return image_files, sub_directories
+
+    with entries:
+        for entry in entries:
+            # Don't follow links to directories, which could create cycles
+            if entry.is_dir(follow_symlinks=False):
+                sub_directories.append(entry.path)
+                continue
+            ext = splitext(entry.name)[1].lower()
+            if ext in extensions and entry.is_file():
+                stat = entry.stat()
+                image_files.append(
+                    (entry.path,
+                     (stat.st_size, stat.st_mtime_ns, entry.inode()))
+                )
+    return image_files, sub_directories
+
+
+def iter_images_metadata(images, batch_size=METADATA_BATCH_SIZE,
+                         max_workers=METADATA_MAX_WORKERS):
+    """ Read the metadata of the image files in batches of batch_size,
+    reading up to max_workers files at once, and yield the metadata of each
+    batch. Closing the generator stops reading after the current batch.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for start in range(0, len(images), batch_size):
+            batch = images[start:start + batch_size]
+            yield list(executor.map(attrgetter("metadata"), batch))
+
+
+def read_images_metadata(images, max_workers=METADATA_MAX_WORKERS):
+    """ Return the metadata of each of the image files, reading up to
+    max_workers files at once.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(attrgetter("metadata"), images))
+
+
+def iter_faces_parallel(image_files, indices=None, max_workers=None,
+                        chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+    """ Detect faces in the image files (ImageFile objects or paths) using a
+    pool of worker processes.
+
+    Workers receive chunks of file paths rather than decoded arrays, and
+    send back compact face arrays. Each chunk's results are yielded as soon
+    as it completes, as a list of (index, faces) pairs, where indices
+    default to positions in image_files. Closing the generator drops the
+    chunks not started yet, and doesn't wait for the running ones.
+    """
+    executor = _process_pool(max_workers)
+    try:
+        yield from _iter_faces_with_indices(
+            iter_detect_faces_batch(image_files, executor=executor,
+                                    chunk_size=chunk_size, **kwargs),
+            indices
+        )
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _process_pool(max_workers):
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context(MP_START_METHOD)
+    )
+
+
+def _iter_faces_with_indices(batches, indices=None):
+    """ Map the positions of the (position, faces) pairs of each batch to
+    the provided indices, if any.
+    """
+    with closing(batches):
+        for batch in batches:
+            if indices is not None:
+                batch = [(indices[position], faces)
+                         for position, faces in batch]
+            yield batch
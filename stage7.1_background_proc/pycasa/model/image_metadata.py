@@ -0,0 +1,151 @@
+""" Fast image metadata reader, parsing only the file header.
+
+EXIF data lives in the APP1 segment of JPEG files and in the eXIf chunk of
+PNG files, both located before the compressed pixel data. Reading segment
+headers and seeking past everything else means the cost of reading the
+metadata depends on the header size, not the file size, and pixels are never
+decoded.
+"""
+# General imports
+from os.path import splitext
+import struct
+import zlib
+
+import PIL.Image
+from PIL.ExifTags import TAGS
+
+JPEG_SOI = b"\xff\xd8"
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+EXIF_HEADER = b"Exif\x00\x00"
+
+# JPEG markers: APP1, start of scan, end of image
+APP1, SOS, EOI = 0xE1, 0xDA, 0xD9
+
+# JPEG markers without a length field
+STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))
+
+EXIF_IFD = 0x8769
+
+GPS_IFD = 0x8825
+
+
+def read_metadata(filepath):
+    """ Return the metadata of a JPEG or PNG file as a dictionary.
+
+    Keys are EXIF tag names, plus the keywords of any PNG text chunks.
+    Unknown formats and files without metadata return an empty dictionary.
+    """
+    ext = splitext(filepath)[1].lower()
+    with open(filepath, "rb") as fp:
+        if ext in {".jpg", ".jpeg"}:
+            exif, text = _read_jpeg_header(fp), {}
+        elif ext == ".png":
+            exif, text = _read_png_header(fp)
+        else:
+            return {}
+
+    metadata = _parse_exif(exif) if exif else {}
+    metadata.update(text)
+    return metadata
+
+
+def _parse_exif(exif_data):
+    """ Convert raw EXIF data into a dictionary of named tags, merging the
+    EXIF sub-IFD and GPS IFD like PIL's JPEG plugin does.
+    """
+    exif = PIL.Image.Exif()
+    exif.load(exif_data)
+    tags = dict(exif)
+    if EXIF_IFD in exif:
+        tags.update(exif.get_ifd(EXIF_IFD))
+    if GPS_IFD in exif:
+        tags[GPS_IFD] = exif.get_ifd(GPS_IFD)
+    return {TAGS[k]: v for k, v in tags.items() if k in TAGS}
+
+
+def _read_jpeg_header(fp):
+    """ Return the EXIF APP1 payload of a JPEG file, or None.
+    """
+    if fp.read(2) != JPEG_SOI:
+        return None
+
+    while True:
+        marker = fp.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        if code == 0xFF:
+            # Fill byte: the marker code is the next byte.
+            fp.seek(-1, 1)
+            continue
+        if code in (SOS, EOI):
+            # Pixel data follows: there is no metadata left to find.
+            return None
+        if code in STANDALONE_MARKERS:
+            continue
+
+        size = fp.read(2)
+        if len(size) < 2:
+            return None
+        length = struct.unpack(">H", size)[0] - 2
+        if code == APP1:
+            payload = fp.read(length)
+            if payload.startswith(EXIF_HEADER):
+                return payload
+        else:
+            fp.seek(length, 1)
+
+
+def _read_png_header(fp):
+    """ Return the eXIf chunk (or None) and the text chunks found before the
+    image data of a PNG file.
+    """
+    exif, text = None, {}
+    if fp.read(8) != PNG_SIGNATURE:
+        return exif, text
+
+    while True:
+        header = fp.read(8)
+        if len(header) < 8:
+            break
+        length, chunk_type = struct.unpack(">I4s", header)
+        if chunk_type in (b"IDAT", b"IEND"):
+            break
+
+        if chunk_type in (b"eXIf", b"tEXt", b"zTXt", b"iTXt"):
+            chunk = fp.read(length)
+            if chunk_type == b"eXIf":
+                exif = chunk
+            else:
+                text.update(_parse_png_text(chunk_type, chunk))
+            # Skip CRC
+            fp.seek(4, 1)
+        else:
+            fp.seek(length + 4, 1)
+
+    return exif, text
+
+
+def _parse_png_text(chunk_type, chunk):
+    """ Decode a tEXt, zTXt or iTXt chunk into a {keyword: text} dictionary.
+    """
+    keyword, _, value = chunk.partition(b"\x00")
+    keyword = keyword.decode("latin-1")
+    try:
+        if chunk_type == b"tEXt":
+            text = value.decode("latin-1")
+        elif chunk_type == b"zTXt":
+            # First byte is the compression method (always zlib)
+            text = zlib.decompress(value[1:]).decode("latin-1")
+        else:
+            compressed, value = value[0], value[2:]
+            _, _, value = value.partition(b"\x00")  # language tag
+            _, _, value = value.partition(b"\x00")  # translated keyword
+            if compressed:
+                value = zlib.decompress(value)
+            text = value.decode("utf-8")
+    except (zlib.error, UnicodeDecodeError, IndexError):
+        return {}
+    return {keyword: text}
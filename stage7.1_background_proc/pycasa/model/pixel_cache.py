@@ -0,0 +1,110 @@
+# General imports
+from collections import OrderedDict
+import threading
+
+# ETS imports
+from traits.api import Any, Float, HasStrictTraits, Instance, Int, observe
+
+#: Default memory budget of the shared pixel cache, in MB
+DEFAULT_MAX_SIZE_MB = 512.
+
+_shared_cache = None
+
+_shared_cache_lock = threading.Lock()
+
+
+class PixelCache(HasStrictTraits):
+    """ Least recently used cache of decoded image arrays, bounded by the
+    number of bytes of the arrays it holds.
+
+    Arrays are evicted, least recently used first, once the budget is
+    exceeded, and decoded again the next time they are requested. The cache
+    can be used from several threads at once.
+    """
+    #: Memory budget, in MB
+    max_size_mb = Float(DEFAULT_MAX_SIZE_MB)
+
+    #: Number of requests served from the cache
+    hits = Int
+
+    #: Number of requests which required decoding an image
+    misses = Int
+
+    #: Number of arrays evicted to stay within the budget
+    evictions = Int
+
+    #: Number of bytes of the arrays currently held
+    num_bytes = Int
+
+    _arrays = Instance(OrderedDict, ())
+
+    _lock = Any(factory=threading.Lock)
+
+    def get(self, key, decode, store=True):
+        """ Return the array cached for key, calling decode() to create it
+        if it isn't available, and caching it unless store is False.
+        """
+        with self._lock:
+            array = self._arrays.get(key)
+            if array is not None:
+                self._arrays.move_to_end(key)
+                self.hits += 1
+                return array
+            self.misses += 1
+
+        # Decode without holding the lock, so images are decoded in parallel
+        array = decode()
+        if not store:
+            return array
+        with self._lock:
+            if key not in self._arrays:
+                self._arrays[key] = array
+                self.num_bytes += array.nbytes
+                self._evict()
+        return array
+
+    def clear(self):
+        """ Drop all the cached arrays.
+        """
+        with self._lock:
+            self._arrays.clear()
+            self.num_bytes = 0
+
+    def stats(self):
+        """ Return the cache statistics as a dictionary.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "num_arrays": len(self._arrays),
+                "num_bytes": self.num_bytes,
+                "max_bytes": self._max_bytes(),
+            }
+
+    def _evict(self):
+        """ Drop the least recently used arrays until the budget is met. An
+        array larger than the whole budget is dropped as soon as it's added.
+        """
+        max_bytes = self._max_bytes()
+        while self.num_bytes > max_bytes and self._arrays:
+            _, array = self._arrays.popitem(last=False)
+            self.num_bytes -= array.nbytes
+            self.evictions += 1
+
+    def _max_bytes(self):
+        return int(self.max_size_mb * 2**20)
+
+    @observe("max_size_mb")
+    def _apply_new_budget(self, event):
+        with self._lock:
+            self._evict()
+
+
+def get_pixel_cache():
+    """ Return the pixel cache shared by all image files.
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = PixelCache()
+        return _shared_cache
@@ -0,0 +1,117 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+from os.path import dirname, join
+from shutil import copy, rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from pycasa.model.batch_detection import (
+    detect_faces_batch, FACES_COL, FILEPATH_COL, iter_detect_faces_batch,
+    NUM_FACES_COL
+)
+from pycasa.model.detection_cache import DetectionCache
+from pycasa.model.face_detector import get_face_detector
+from pycasa.model.faces import as_face_array, FACE_DTYPE, faces_to_list
+from pycasa.model.image_file import ImageFile
+from pycasa.model.image_folder import MP_START_METHOD
+
+import ets_tutorial
+
+TUTORIAL_DIR = dirname(ets_tutorial.__file__)
+
+SAMPLE_IMG_DIR = join(TUTORIAL_DIR, "..", "sample_images")
+
+SAMPLE_IMG1 = join(SAMPLE_IMG_DIR, "IMG-0311_xmas_2020.JPG")
+
+FAKE_FACES = as_face_array([{"r": 1, "c": 2, "width": 3, "height": 4}])
+
+
+class TestDetectFacesBatch(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.filepaths = [
+            copy(SAMPLE_IMG1, join(self.directory, f"img_{i}.jpg"))
+            for i in range(5)
+        ]
+        self.expected = faces_to_list(
+            ImageFile(filepath=SAMPLE_IMG1).detect_faces()
+        )
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_result_table(self):
+        table = detect_faces_batch(self.filepaths, chunk_size=2)
+        self.assertEqual(table[FILEPATH_COL].tolist(), self.filepaths)
+        self.assertEqual(table[NUM_FACES_COL].tolist(),
+                         [len(self.expected)] * 5)
+        for faces in table[FACES_COL]:
+            self.assertEqual(faces.dtype, FACE_DTYPE)
+            self.assertEqual(faces_to_list(faces), self.expected)
+
+    def test_faces_of_image_files_set(self):
+        images = [ImageFile(filepath=path) for path in self.filepaths]
+        detect_faces_batch(images)
+        for img in images:
+            self.assertEqual(faces_to_list(img.faces), self.expected)
+
+    def test_executor(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            table = detect_faces_batch(self.filepaths, executor=executor,
+                                       chunk_size=2)
+        self.assertEqual(table[FILEPATH_COL].tolist(), self.filepaths)
+        self.assertEqual(table[NUM_FACES_COL].tolist(),
+                         [len(self.expected)] * 5)
+
+    def test_process_pool(self):
+        with ProcessPoolExecutor(
+            max_workers=2,
+            mp_context=multiprocessing.get_context(MP_START_METHOD)
+        ) as executor:
+            table = detect_faces_batch(self.filepaths, executor=executor,
+                                       chunk_size=1)
+        self.assertEqual(table[NUM_FACES_COL].tolist(),
+                         [len(self.expected)] * 5)
+        for faces in table[FACES_COL]:
+            self.assertEqual(faces_to_list(faces), self.expected)
+
+    def test_iter_batches(self):
+        images = [ImageFile(filepath=path) for path in self.filepaths]
+        batches = list(iter_detect_faces_batch(images))
+        # One image at a time, in order, without touching the image files
+        self.assertEqual([[pos for pos, _ in batch] for batch in batches],
+                         [[0], [1], [2], [3], [4]])
+        self.assertTrue(all(len(img.faces) == 0 for img in images))
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            batches = list(iter_detect_faces_batch(
+                images, executor=executor, chunk_size=2
+            ))
+        self.assertEqual(sorted(len(batch) for batch in batches), [1, 2, 2])
+        positions = sorted(pos for batch in batches for pos, _ in batch)
+        self.assertEqual(positions, [0, 1, 2, 3, 4])
+
+    def test_close_stops_search(self):
+        batches = iter_detect_faces_batch(self.filepaths)
+        next(batches)
+        batches.close()
+        with self.assertRaises(StopIteration):
+            next(batches)
+
+    def test_detection_cache(self):
+        cache = DetectionCache(filepath=join(self.directory, "faces.sqlite"))
+        cache.set(self.filepaths[0], get_face_detector(), FAKE_FACES)
+        table = detect_faces_batch(self.filepaths, detection_cache=cache)
+        # Cached results are used, and new results stored
+        self.assertEqual(faces_to_list(table[FACES_COL][0]),
+                         faces_to_list(FAKE_FACES))
+        self.assertEqual(
+            faces_to_list(cache.get(self.filepaths[1], get_face_detector())),
+            self.expected
+        )
+
+    def test_pixels_released(self):
+        images = [ImageFile(filepath=path) for path in self.filepaths]
+        num_bytes = images[0].pixel_cache.num_bytes
+        detect_faces_batch(images)
+        self.assertEqual(images[0].pixel_cache.num_bytes, num_bytes)
@@ -0,0 +1,153 @@
+import os
+from os.path import dirname, join
+from shutil import copy, rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+import numpy as np
+
+from pycasa.model.detection_cache import DetectionCache
+from pycasa.model.face_detector import get_face_detector
+from pycasa.model.faces import as_face_array, faces_to_list
+from pycasa.model.file_signature import file_signature
+from pycasa.model.image_file import ImageFile
+from pycasa.model.image_folder import ImageFolder, NUM_FACE_COL
+
+import ets_tutorial
+
+TUTORIAL_DIR = dirname(ets_tutorial.__file__)
+
+SAMPLE_IMG_DIR = join(TUTORIAL_DIR, "..", "sample_images")
+
+SAMPLE_IMG1 = join(SAMPLE_IMG_DIR, "IMG-0311_xmas_2020.JPG")
+
+FAKE_FACES = as_face_array([{"r": 1, "c": 2, "width": 3, "height": 4}])
+
+
+class TestDetectionCache(TestCase):
+    def assert_faces_equal(self, faces, expected):
+        self.assertEqual(faces_to_list(faces), faces_to_list(expected))
+
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+        self.img_filepath = join(self.tmp_dir, "img.jpg")
+        copy(SAMPLE_IMG1, self.img_filepath)
+        self.cache = DetectionCache(
+            filepath=join(self.tmp_dir, "cache", "faces.sqlite")
+        )
+        self.detector = get_face_detector()
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def test_unknown_image(self):
+        self.assertIsNone(self.cache.get(self.img_filepath, self.detector))
+
+    def test_stored_faces(self):
+        self.cache.set(self.img_filepath, self.detector, FAKE_FACES)
+        faces = self.cache.get(self.img_filepath, self.detector)
+        self.assert_faces_equal(faces, FAKE_FACES)
+
+    def test_persisted_across_instances(self):
+        self.cache.set(self.img_filepath, self.detector, FAKE_FACES)
+        cache = DetectionCache(filepath=self.cache.filepath)
+        self.assert_faces_equal(cache.get(self.img_filepath, self.detector),
+                                FAKE_FACES)
+
+    def test_detector_parameters_in_key(self):
+        self.cache.set(self.img_filepath, self.detector, FAKE_FACES)
+        other_detector = get_face_detector(min_size=(30, 30))
+        self.assertIsNone(self.cache.get(self.img_filepath, other_detector))
+
+    def test_modified_file_invalidates_entry(self):
+        self.cache.set(self.img_filepath, self.detector, FAKE_FACES)
+        stat = os.stat(self.img_filepath)
+        os.utime(self.img_filepath,
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertIsNone(self.cache.get(self.img_filepath, self.detector))
+
+    def test_get_many(self):
+        self.cache.set(self.img_filepath, self.detector, FAKE_FACES)
+        missing = join(self.tmp_dir, "missing.jpg")
+        results = self.cache.get_many([missing, self.img_filepath],
+                                      self.detector)
+        self.assertIsNone(results[0])
+        self.assert_faces_equal(results[1], FAKE_FACES)
+
+    def test_get_many_reads_requested_entries_only(self):
+        connection = self.cache._connection()
+        with connection:
+            connection.executemany(
+                "INSERT INTO faces VALUES (?, ?, 0, 0, '[]')",
+                [(f"/other/img_{i}.jpg", self.detector.key)
+                 for i in range(20000)]
+            )
+        self.cache.set(self.img_filepath, self.detector, FAKE_FACES)
+        # Count the SQLite virtual machine steps of the lookup: reading the
+        # 20000 other entries would take hundreds of thousands.
+        steps = []
+        connection.set_progress_handler(lambda: steps.append(1), 100)
+        self.addCleanup(connection.set_progress_handler, None, 0)
+        results = self.cache.get_many([self.img_filepath], self.detector)
+        self.assert_faces_equal(results[0], FAKE_FACES)
+        self.assertLess(len(steps), 10)
+
+    def test_get_many_in_batches(self):
+        self.cache.set(self.img_filepath, self.detector, FAKE_FACES)
+        missing = [join(self.tmp_dir, f"img_{i}.jpg") for i in range(1200)]
+        results = self.cache.get_many(
+            missing + [self.img_filepath, self.img_filepath], self.detector
+        )
+        self.assertEqual(results[:1200], [None] * 1200)
+        self.assert_faces_equal(results[1200], FAKE_FACES)
+        self.assert_faces_equal(results[1201], FAKE_FACES)
+
+    def test_get_many_with_signatures(self):
+        self.cache.set(self.img_filepath, self.detector, FAKE_FACES)
+        stat = os.stat(self.img_filepath)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        results = self.cache.get_many([self.img_filepath], self.detector,
+                                      signatures=[signature])
+        self.assert_faces_equal(results[0], FAKE_FACES)
+        stale_signature = (stat.st_size + 1, stat.st_mtime_ns)
+        results = self.cache.get_many([self.img_filepath], self.detector,
+                                      signatures=[stale_signature])
+        self.assertEqual(results, [None])
+
+    def test_image_file_uses_cache(self):
+        img = ImageFile(filepath=self.img_filepath,
+                        detection_cache=self.cache)
+        faces = img.detect_faces()
+        self.assert_faces_equal(
+            self.cache.get(self.img_filepath, self.detector), faces
+        )
+
+        self.cache.set(self.img_filepath, self.detector, FAKE_FACES)
+        img = ImageFile(filepath=self.img_filepath,
+                        detection_cache=self.cache)
+        self.assert_faces_equal(img.detect_faces(), FAKE_FACES)
+
+    def test_legacy_entries(self):
+        # Entries stored as lists of dicts are still read
+        connection = self.cache._connection()
+        with connection:
+            connection.execute(
+                "INSERT INTO faces VALUES (?, ?, ?, ?, ?)",
+                (self.img_filepath, self.detector.key) +
+                file_signature(self.img_filepath)[:2] +
+                ('[{"r": 1, "c": 2, "width": 3, "height": 4}]',)
+            )
+        self.assert_faces_equal(
+            self.cache.get(self.img_filepath, self.detector), FAKE_FACES
+        )
+
+    def test_image_folder_uses_cache(self):
+        self.cache.set(self.img_filepath, self.detector, FAKE_FACES)
+        img_folder = ImageFolder(directory=self.tmp_dir,
+                                 detection_cache=self.cache)
+        self.assertEqual(img_folder.images[0].detection_cache, self.cache)
+        self.assertEqual(img_folder.data[NUM_FACE_COL].tolist(), [1])
+        self.assert_faces_equal(img_folder.images[0].faces, FAKE_FACES)
+
+        img_folder = ImageFolder(directory=self.tmp_dir)
+        self.assertTrue(np.isnan(img_folder.data[NUM_FACE_COL]).all())
@@ -0,0 +1,172 @@
+from os.path import dirname, join
+from threading import Thread
+from unittest import mock, TestCase
+
+import numpy as np
+import PIL.Image
+
+from pycasa.model import face_detector
+from pycasa.model.face_detector import (
+    _tile_starts, FaceDetector, get_face_detector, rescale_faces
+)
+from pycasa.model.faces import (
+    as_face_array, empty_faces, FACE_DTYPE, faces_to_list,
+    non_max_suppression
+)
+
+import ets_tutorial
+
+TUTORIAL_DIR = dirname(ets_tutorial.__file__)
+
+SAMPLE_IMG_DIR = join(TUTORIAL_DIR, "..", "sample_images")
+
+SAMPLE_IMG1 = join(SAMPLE_IMG_DIR, "IMG-0311_xmas_2020.JPG")
+
+
+class BoxDetector(FaceDetector):
+    """ Detector reporting the bounding box of the non-zero pixels of the
+    image searched as a face.
+    """
+    def _detect_multi_scale(self, img_data, min_size, max_size):
+        rows, cols = np.nonzero(img_data)
+        if not len(rows):
+            return empty_faces()
+        return as_face_array([{
+            "r": rows.min(), "c": cols.min(),
+            "width": cols.max() + 1 - cols.min(),
+            "height": rows.max() + 1 - rows.min(),
+        }])
+
+
+class TestFaceDetector(TestCase):
+    def test_detector_reused_in_thread(self):
+        detector = get_face_detector()
+        self.assertIsInstance(detector, FaceDetector)
+        self.assertIs(get_face_detector(), detector)
+        self.assertIs(detector.cascade, detector.cascade)
+
+    def test_detector_per_parameters(self):
+        detector = get_face_detector()
+        other = get_face_detector(scale_factor=1.5)
+        self.assertIsNot(detector, other)
+        self.assertEqual(other.scale_factor, 1.5)
+        self.assertIs(get_face_detector(scale_factor=1.5), other)
+
+    def test_detector_per_thread(self):
+        detector = get_face_detector()
+        detectors = []
+        thread = Thread(target=lambda: detectors.append(get_face_detector()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(detectors[0], detector)
+
+    def test_detect_empty_image(self):
+        detector = get_face_detector()
+        faces = detector.detect(np.array([]))
+        self.assertEqual(faces.dtype, FACE_DTYPE)
+        self.assertEqual(len(faces), 0)
+
+    def test_working_scale(self):
+        detector = get_face_detector(max_side=1024)
+        self.assertEqual(detector.working_scale((768, 1024, 3)), 1.)
+        self.assertEqual(detector.working_scale((1536, 2048, 3)), 0.5)
+        self.assertEqual(get_face_detector().working_scale((1536, 2048)), 1.)
+
+    def test_max_side_in_key(self):
+        detector = get_face_detector()
+        other = get_face_detector(max_side=1024)
+        self.assertIsNot(detector, other)
+        self.assertNotEqual(detector.key, other.key)
+        # Keys of full resolution detectors don't mention the max side
+        self.assertNotIn("1024", get_face_detector().key)
+
+    def test_iou_threshold_in_key(self):
+        detector = get_face_detector()
+        self.assertIn("iou_threshold", detector.key)
+        without_nms = get_face_detector(iou_threshold=1)
+        self.assertNotEqual(without_nms.key, detector.key)
+        self.assertNotIn("iou_threshold", without_nms.key)
+
+    def test_tile_size_in_key(self):
+        detector = get_face_detector()
+        tiled = get_face_detector(tile_size=2048)
+        self.assertIsNot(tiled, detector)
+        self.assertIn("tile_size", tiled.key)
+        self.assertNotIn("tile_size", detector.key)
+
+    def test_tile_starts(self):
+        self.assertEqual(_tile_starts(500, 600, 300), [0])
+        self.assertEqual(_tile_starts(1000, 600, 200), [0, 400])
+        self.assertEqual(_tile_starts(1000, 600, 300), [0, 200, 400])
+        starts = _tile_starts(5000, 1000, 200)
+        self.assertEqual(starts[0], 0)
+        self.assertEqual(starts[-1] + 1000, 5000)
+        # Consecutive tiles overlap by at least the requested overlap
+        self.assertTrue(all(np.diff(starts) <= 800))
+
+    def test_tiled_detection(self):
+        # Faces found in the whole image are found when searching tiles,
+        # and faces in the overlap between tiles are only reported once.
+        with PIL.Image.open(SAMPLE_IMG1) as img:
+            img_data = np.asarray(img)
+        expected = get_face_detector(max_size=(300, 300)).detect(img_data)
+        detector = get_face_detector(max_size=(300, 300), tile_size=600)
+        faces = detector.detect(img_data)
+        self.assertGreater(len(expected), 0)
+        for expected_face in expected:
+            tolerance = 0.25 * expected_face["width"]
+            self.assertTrue(any(
+                all(abs(face[key] - expected_face[key]) <= tolerance
+                    for key in ["r", "c", "width", "height"])
+                for face in faces
+            ))
+        self.assertEqual(len(non_max_suppression(faces)), len(faces))
+
+    def test_tiled_detection_single_cascade(self):
+        with PIL.Image.open(SAMPLE_IMG1) as img:
+            img_data = np.asarray(img.convert("L"))
+        with mock.patch.object(face_detector, "Cascade",
+                               wraps=face_detector.Cascade) as cascade:
+            detector = FaceDetector(max_size=(300, 300), tile_size=600)
+            detector.detect(img_data)
+            detector.detect(img_data)
+        self.assertEqual(cascade.call_count, 1)
+
+    def test_largest_faces_in_tile_overlap(self):
+        # Faces as large as max_size are found once wherever they are, e.g.
+        # filling the overlap between two tiles (903 pixels wide images are
+        # split into two 602 pixels wide tiles overlapping by 301 pixels).
+        detector = BoxDetector(max_size=(300, 300), tile_size=600)
+        for width, step in [(903, 1), (1000, 11)]:
+            for left in range(0, width - 300 + 1, step):
+                img_data = np.zeros((300, width), dtype=np.uint8)
+                img_data[:, left:left + 300] = 255
+                faces = faces_to_list(detector.detect(img_data))
+                self.assertEqual(faces, [[0, left, 300, 300, None]],
+                                 msg=f"width={width}, left={left}")
+
+    def test_rescale_faces(self):
+        faces = as_face_array([{"r": 10, "c": 20, "width": 30, "height": 40}])
+        self.assertEqual(
+            faces_to_list(rescale_faces(faces, 2, 3)),
+            [[20, 60, 90, 80, None]]
+        )
+
+    def test_downscaled_detection(self):
+        # Faces found in the original image are found in a 2x upscaled copy
+        # searched at the original resolution, in upscaled coordinates.
+        with PIL.Image.open(SAMPLE_IMG1) as img:
+            original = np.asarray(img)
+            upscaled = np.asarray(
+                img.resize((2 * img.width, 2 * img.height))
+            )
+        expected = get_face_detector().detect(original)
+        faces = get_face_detector(max_side=original.shape[1]).detect(upscaled)
+        self.assertGreater(len(expected), 0)
+        for expected_face in expected:
+            tolerance = 0.25 * expected_face["width"]
+            self.assertTrue(any(
+                all(abs(face[key] - 2 * expected_face[key]) <= tolerance
+                    for key in ["r", "c", "width", "height"])
+                for face in faces
+            ))
@@ -0,0 +1,118 @@
+from unittest import TestCase
+
+import numpy as np
+
+from pycasa.model.faces import (
+    as_face_array, concatenate_faces, empty_faces, FACE_DTYPE,
+    faces_to_list, FOLDER_FACE_DTYPE, non_max_suppression
+)
+
+
+def iou(face1, face2):
+    """ Intersection over union of 2 faces, computed one at a time.
+    """
+    r1, c1, w1, h1 = face1[:4]
+    r2, c2, w2, h2 = face2[:4]
+    height = max(0, min(r1 + h1, r2 + h2) - max(r1, r2))
+    width = max(0, min(c1 + w1, c2 + w2) - max(c1, c2))
+    intersection = height * width
+    return intersection / (w1 * h1 + w2 * h2 - intersection)
+
+
+def reference_nms(faces, iou_threshold):
+    """ Reference non-maximum suppression, for faces without scores.
+    """
+    faces = faces_to_list(faces)
+    order = sorted(range(len(faces)),
+                   key=lambda i: -faces[i][2] * faces[i][3])
+    keep = []
+    for i in order:
+        if all(iou(faces[i], faces[j]) <= iou_threshold for j in keep):
+            keep.append(i)
+    return sorted(keep)
+
+
+class TestFaces(TestCase):
+    def test_from_dicts(self):
+        faces = as_face_array([
+            {"r": 1, "c": 2, "width": 3, "height": 4},
+            {"r": 5, "c": 6, "width": 7, "height": 8, "score": 0.5},
+        ])
+        self.assertEqual(faces.dtype, FACE_DTYPE)
+        self.assertEqual(faces["r"].tolist(), [1, 5])
+        self.assertEqual(faces["height"].tolist(), [4, 8])
+        self.assertTrue(np.isnan(faces["score"][0]))
+        self.assertEqual(faces["score"][1], 0.5)
+
+    def test_round_trip(self):
+        faces_list = [[1, 2, 3, 4, None], [5, 6, 7, 8, 0.5]]
+        faces = as_face_array(faces_list)
+        self.assertEqual(faces_to_list(faces), faces_list)
+        self.assertIs(as_face_array(faces), faces)
+
+    def test_no_faces(self):
+        self.assertEqual(as_face_array([]).dtype, FACE_DTYPE)
+        self.assertEqual(faces_to_list(empty_faces()), [])
+
+    def test_concatenate_faces(self):
+        faces = as_face_array([[1, 2, 3, 4], [5, 6, 7, 8]])
+        folder_faces = concatenate_faces([faces, empty_faces(), faces[1:]])
+        self.assertEqual(folder_faces.dtype, FOLDER_FACE_DTYPE)
+        self.assertEqual(folder_faces["image"].tolist(), [0, 0, 2])
+        self.assertEqual(folder_faces["r"].tolist(), [1, 5, 5])
+        self.assertEqual(len(concatenate_faces([])), 0)
+
+    def test_compact(self):
+        # A million faces take about 20 MB
+        self.assertEqual(FACE_DTYPE.itemsize, 20)
+        self.assertEqual(FOLDER_FACE_DTYPE.itemsize, 24)
+
+
+class TestNonMaxSuppression(TestCase):
+    def test_overlapping_faces_merged(self):
+        faces = as_face_array([
+            [0, 0, 100, 100], [10, 10, 90, 90], [200, 200, 50, 50],
+            [5, 0, 100, 100],
+        ])
+        kept = non_max_suppression(faces, iou_threshold=0.3)
+        self.assertEqual(faces_to_list(kept), faces_to_list(faces[[0, 2]]))
+
+    def test_threshold(self):
+        faces = as_face_array([[0, 0, 100, 100], [50, 0, 100, 100]])
+        # Intersection over union is 1/3
+        self.assertEqual(len(non_max_suppression(faces, 0.3)), 1)
+        self.assertEqual(len(non_max_suppression(faces, 0.4)), 2)
+
+    def test_best_score_kept(self):
+        faces = as_face_array([[0, 0, 100, 100, 0.2], [5, 5, 90, 90, 0.9]])
+        kept = non_max_suppression(faces)
+        self.assertEqual(faces_to_list(kept), faces_to_list(faces[1:]))
+
+    def test_same_as_reference(self):
+        rng = np.random.default_rng(0)
+        num_faces = 300
+        sizes = rng.integers(40, 300, num_faces)
+        faces = as_face_array(list(zip(
+            rng.integers(0, 2000, num_faces), rng.integers(0, 2000, num_faces),
+            sizes, sizes
+        )))
+        kept = non_max_suppression(faces, iou_threshold=0.3)
+        expected = faces[reference_nms(faces, 0.3)]
+        self.assertEqual(faces_to_list(kept), faces_to_list(expected))
+
+    def test_clustered_faces_same_as_reference(self):
+        # Several detections per face, of different shapes, some of them
+        # partly outside the image
+        rng = np.random.default_rng(1)
+        centers = np.repeat(rng.integers(-50, 1000, (60, 2)), 5, axis=0)
+        boxes = np.hstack([
+            centers + rng.integers(-10, 10, centers.shape),
+            rng.integers(20, 120, centers.shape),
+        ])
+        faces = as_face_array(boxes.tolist())
+        kept = non_max_suppression(faces, iou_threshold=0.3)
+        expected = faces[reference_nms(faces, 0.3)]
+        self.assertEqual(faces_to_list(kept), faces_to_list(expected))
+
+    def test_no_faces(self):
+        self.assertEqual(len(non_max_suppression(empty_faces())), 0)
@@ -0,0 +1,31 @@
+from os.path import dirname, join
+from shutil import copy, rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from pycasa.model.file_signature import file_signature
+from pycasa.model.image_folder import list_image_files
+
+import ets_tutorial
+
+TUTORIAL_DIR = dirname(ets_tutorial.__file__)
+
+SAMPLE_IMG_DIR = join(TUTORIAL_DIR, "..", "sample_images")
+
+SAMPLE_IMG1 = join(SAMPLE_IMG_DIR, "IMG-0311_xmas_2020.JPG")
+
+
+class TestFileSignature(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_same_as_listing(self):
+        filepath = copy(SAMPLE_IMG1, join(self.directory, "img.jpg"))
+        [(path, signature)] = list_image_files(self.directory)
+        self.assertEqual(file_signature(filepath), signature)
+
+    def test_missing_file(self):
+        self.assertIsNone(file_signature(join(self.directory, "img.jpg")))
@@ -0,0 +1,154 @@
+import os
+from os.path import dirname, join
+from shutil import copy, rmtree
+from tempfile import mkdtemp
+from unittest import skipUnless, TestCase
+
+from traits_futures.api import TraitsExecutor
+from traits_futures.testing.test_assistant import TestAssistant
+
+from pycasa.model.folder_watcher import (
+    inotify_available, iter_directory_changes
+)
+from pycasa.model.image_folder import (
+    ImageFolder, list_image_files, NUM_FACE_COL
+)
+
+import ets_tutorial
+
+TUTORIAL_DIR = dirname(ets_tutorial.__file__)
+
+SAMPLE_IMG_DIR = join(TUTORIAL_DIR, "..", "sample_images")
+
+SAMPLE_IMG1 = join(SAMPLE_IMG_DIR, "IMG-0311_xmas_2020.JPG")
+
+
+class TestIterDirectoryChanges(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+        copy(SAMPLE_IMG1, join(self.directory, "img_0.jpg"))
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def watch(self, use_inotify):
+        changes = iter_directory_changes(
+            self.directory, lambda: list_image_files(self.directory),
+            poll_interval=0.05, debounce=0.2, use_inotify=use_inotify
+        )
+        self.addCleanup(changes.close)
+        return changes
+
+    def assert_changes_reported(self, changes):
+        # Both changes are reported at once, after the debounce delay, with
+        # the new list of image files.
+        self.assertIsNone(next(changes))
+        copy(SAMPLE_IMG1, join(self.directory, "img_1.jpg"))
+        os.remove(join(self.directory, "img_0.jpg"))
+        reported = [
+            listing for listing in (next(changes) for _ in range(10))
+            if listing is not None
+        ]
+        self.assertEqual(reported, [list_image_files(self.directory)])
+        self.assertEqual([path for path, _ in reported[0]],
+                         [join(self.directory, "img_1.jpg")])
+        self.assertEqual([next(changes) for _ in range(5)], [None] * 5)
+
+    def test_polling(self):
+        self.assert_changes_reported(self.watch(use_inotify=False))
+
+    @skipUnless(inotify_available(), "inotify_simple is not installed")
+    def test_inotify(self):
+        self.assert_changes_reported(self.watch(use_inotify=True))
+
+    def test_other_files_ignored(self):
+        changes = self.watch(use_inotify=True)
+        next(changes)
+        with open(join(self.directory, "notes.txt"), "w") as fp:
+            fp.write("Not an image")
+        self.assertEqual([next(changes) for _ in range(5)], [None] * 5)
+
+    def test_max_delay(self):
+        changes = iter_directory_changes(
+            self.directory, lambda: list_image_files(self.directory),
+            poll_interval=0.05, debounce=0.2, max_delay=0.2,
+            use_inotify=False
+        )
+        self.addCleanup(changes.close)
+        next(changes)
+        # Files keep changing faster than the debounce delay.
+        reported = []
+        for i in range(10):
+            copy(SAMPLE_IMG1, join(self.directory, f"img_{i + 1}.jpg"))
+            reported.append(next(changes))
+        self.assertTrue(any(listing is not None for listing in reported))
+
+
+class TestWatchedFolder(TestAssistant, TestCase):
+    def setUp(self):
+        TestAssistant.setUp(self)
+        self.executor = TraitsExecutor(event_loop=self._event_loop)
+        self.directory = mkdtemp()
+        copy(SAMPLE_IMG1, join(self.directory, "img_0.jpg"))
+
+    def tearDown(self):
+        self.executor.shutdown()
+        rmtree(self.directory)
+        TestAssistant.tearDown(self)
+
+    def create_folder(self, **traits):
+        img_folder = ImageFolder(directory=self.directory,
+                                 traits_executor=self.executor, watch=True,
+                                 watch_interval=0.05, watch_debounce=0.1,
+                                 **traits)
+        self.run_until(img_folder, "loading_metadata",
+                       lambda obj: not obj.loading_metadata)
+        return img_folder
+
+    def test_new_and_removed_files(self):
+        img_folder = self.create_folder()
+        data_replaced = []
+        img_folder.observe(data_replaced.append, "data")
+        copy(SAMPLE_IMG1, join(self.directory, "img_1.jpg"))
+        self.run_until(img_folder, "rows_changed",
+                       lambda obj: len(obj.images) == 2)
+        self.assertEqual(len(img_folder.data), 2)
+        # The new file's row was appended to a new DataFrame
+        self.assertIs(data_replaced[-1].new, img_folder.data)
+        # The new file's metadata is read in the background
+        self.assertTrue(img_folder.loading_metadata)
+        self.run_until(img_folder, "loading_metadata",
+                       lambda obj: not obj.loading_metadata)
+        self.assertEqual(img_folder.data["ExifVersion"].notna().sum(), 2)
+
+        os.remove(join(self.directory, "img_0.jpg"))
+        self.run_until(img_folder, "rows_changed",
+                       lambda obj: len(obj.images) == 1)
+        self.assertEqual(len(img_folder.data), 1)
+        # Rows are removed in place
+        self.assertEqual(len(data_replaced), 1)
+
+    def test_auto_scan(self):
+        img_folder = self.create_folder(auto_scan=True)
+        img_folder.data[NUM_FACE_COL] = 0.
+        copy(SAMPLE_IMG1, join(self.directory, "img_1.jpg"))
+        self.run_until(
+            img_folder, "data_updated",
+            lambda obj: len(obj.data) == 2 and
+            not obj.data[NUM_FACE_COL].isna().any()
+        )
+        # Only the new image was scanned
+        self.assertEqual(img_folder.num_to_scan, 1)
+        self.run_until(img_folder, "executor_idle",
+                       lambda obj: obj.executor_idle)
+
+    def test_stop_watching(self):
+        img_folder = self.create_folder()
+        future = img_folder.watch_future
+        img_folder.watch = False
+        self.assertIsNone(img_folder.watch_future)
+        self.run_until(future, "done", lambda future: future.done)
+
+    def test_no_watch_without_executor(self):
+        img_folder = ImageFolder(directory=self.directory, watch=True)
+        self.assertIsNone(img_folder.watch_future)
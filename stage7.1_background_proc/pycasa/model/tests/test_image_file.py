@@ -1,9 +1,15 @@
+import os
 from os.path import dirname, join
+from shutil import rmtree
+from tempfile import mkdtemp
 from unittest import TestCase
 
 import numpy as np
+import PIL.Image
 
+from pycasa.model.faces import FACE_DTYPE
 from pycasa.model.image_file import ImageFile
+from pycasa.model.pixel_cache import PixelCache
 
 import ets_tutorial
 
@@ -46,7 +52,191 @@ class TestImageFile(TestCase):
     def test_face_detection(self):
         img = ImageFile(filepath=SAMPLE_IMG1)
         faces = img.detect_faces()
-        self.assertIsInstance(faces, list)
-        for face in faces:
-            self.assertIsInstance(face, dict)
+        self.assertIsInstance(faces, np.ndarray)
+        self.assertEqual(faces.dtype, FACE_DTYPE)
         self.assertEqual(len(faces), 5)
+
+
+class TestReducedData(TestCase):
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def test_jpeg_draft_decoding(self):
+        img = ImageFile(filepath=SAMPLE_IMG1)
+        # The smallest DCT scale keeping the longest side >= max_side is used
+        self.assertEqual(img.data_at(256).shape, (192, 256, 3))
+        self.assertEqual(img.data_at(300).shape, (384, 512, 3))
+        self.assertEqual(img.data_at(2000).shape, (768, 1024, 3))
+
+    def test_cached_separately(self):
+        img = ImageFile(filepath=SAMPLE_IMG1)
+        reduced = img.data_at(256)
+        self.assertIs(img.data_at(256), reduced)
+        self.assertEqual(img.data.shape, (768, 1024, 3))
+        self.assertIs(img.data_at(256), reduced)
+
+        img.filepath = __file__
+        self.assertEqual(img.data_at(256).shape, (0,))
+
+    def test_other_formats_share_full_data(self):
+        filepath = join(self.tmp_dir, "img.png")
+        PIL.Image.fromarray(np.zeros((100, 200, 3), dtype=np.uint8)).save(
+            filepath
+        )
+        img = ImageFile(filepath=filepath)
+        self.assertIs(img.data_at(50), img.data)
+
+    def test_grayscale_detection_data(self):
+        img = ImageFile(filepath=SAMPLE_IMG1, pixel_cache=PixelCache())
+        data, shape = img.detection_data()
+        self.assertEqual(data.shape, (768, 1024))
+        self.assertEqual(data.dtype, np.uint8)
+        self.assertTrue(data.flags["C_CONTIGUOUS"])
+        self.assertEqual(shape, (768, 1024))
+        self.assertIs(img.detection_data()[0], data)
+        # The display data isn't decoded
+        self.assertEqual(img.pixel_cache.misses, 1)
+
+        data, shape = img.detection_data(256)
+        self.assertEqual(data.shape, (192, 256))
+        self.assertEqual(shape, (768, 1024))
+
+    def test_grayscale_detection_data_other_modes(self):
+        rgba = np.zeros((10, 20, 4), dtype=np.uint8)
+        rgba[..., 1] = 255
+        for mode, pil_img in [
+            ("RGBA", PIL.Image.fromarray(rgba)),
+            ("P", PIL.Image.fromarray(rgba[..., :3]).convert("P")),
+        ]:
+            filepath = join(self.tmp_dir, f"img_{mode}.png")
+            pil_img.save(filepath)
+            data, shape = ImageFile(filepath=filepath).detection_data()
+            self.assertEqual(data.shape, (10, 20))
+            self.assertEqual(data.dtype, np.uint8)
+            self.assertTrue((data > 0).all())
+
+    def test_detection_without_keeping_pixels(self):
+        img = ImageFile(filepath=SAMPLE_IMG1, pixel_cache=PixelCache())
+        img.detect_faces(keep_pixels=False)
+        self.assertEqual(img.pixel_cache.misses, 1)
+        self.assertEqual(img.pixel_cache.num_bytes, 0)
+
+    def test_reduced_detection(self):
+        img = ImageFile(filepath=SAMPLE_IMG1, pixel_cache=PixelCache())
+        faces = img.detect_faces(max_side=512)
+        # Only a reduced image was decoded
+        self.assertEqual(img.pixel_cache.misses, 1)
+        self.assertEqual(img.pixel_cache.num_bytes, 384 * 512)
+
+        # Faces are found in full resolution coordinates
+        full_res_faces = ImageFile(filepath=SAMPLE_IMG1).detect_faces()
+        largest = max(faces, key=lambda face: face["width"])
+        expected = max(full_res_faces, key=lambda face: face["width"])
+        for key in ["r", "c", "width", "height"]:
+            self.assertAlmostEqual(largest[key], expected[key],
+                                   delta=0.1 * expected["width"])
+
+
+class TestModifiedFile(TestCase):
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+        self.filepath = join(self.tmp_dir, "img.png")
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def save(self, value, mtime_offset):
+        PIL.Image.fromarray(
+            np.full((100, 200, 3), value, dtype=np.uint8)
+        ).save(self.filepath)
+        # Make sure the modification is visible despite coarse file times
+        stat = os.stat(self.filepath)
+        os.utime(self.filepath,
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_offset))
+
+    def test_pixels_decoded_again(self):
+        pixel_cache = PixelCache()
+        self.save(0, 0)
+        img = ImageFile(filepath=self.filepath, pixel_cache=pixel_cache)
+        self.assertEqual(img.data.mean(), 0)
+        self.assertEqual(img.detection_data()[0].mean(), 0)
+
+        self.save(200, 10**9)
+        img = ImageFile(filepath=self.filepath, pixel_cache=pixel_cache)
+        self.assertEqual(img.data.mean(), 200)
+        self.assertEqual(img.detection_data()[0].mean(), 200)
+
+
+class TestDisplayPyramid(TestCase):
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def test_jpeg_levels(self):
+        img = ImageFile(filepath=SAMPLE_IMG1, pixel_cache=PixelCache())
+        # 1024 pixels wide: down to 256 pixels
+        self.assertEqual(img.num_pyramid_levels, 3)
+        self.assertEqual(img.pyramid_level(2).shape, (192, 256, 3))
+        # Levels are built lazily, and cached
+        self.assertEqual(img.pixel_cache.misses, 1)
+        self.assertIs(img.pyramid_level(2), img.pyramid_level(2))
+        self.assertEqual(img.pyramid_level(1).shape, (384, 512, 3))
+        self.assertIs(img.pyramid_level(0), img.data)
+        self.assertEqual(img.pixel_cache.misses, 3)
+
+    def test_levels_beyond_jpeg_scales(self):
+        filepath = join(self.tmp_dir, "img.jpg")
+        PIL.Image.new("RGB", (4096, 300)).save(filepath)
+        img = ImageFile(filepath=filepath)
+        self.assertEqual(img.num_pyramid_levels, 5)
+        self.assertEqual(img.pyramid_level(4).shape, (19, 256, 3))
+
+    def test_other_formats(self):
+        filepath = join(self.tmp_dir, "img.png")
+        data = np.zeros((100, 600, 3), dtype=np.uint8)
+        data[:, :300] = 200
+        PIL.Image.fromarray(data).save(filepath)
+        img = ImageFile(filepath=filepath)
+        self.assertEqual(img.num_pyramid_levels, 2)
+        level = img.pyramid_level(1)
+        self.assertEqual(level.shape, (50, 300, 3))
+        self.assertTrue((level[:, :150] == 200).all())
+        self.assertTrue((level[:, 150:] == 0).all())
+
+    def test_palette_and_other_modes(self):
+        data = np.zeros((600, 800), dtype=np.uint8)
+        data[:, :400] = 1
+        palette = PIL.Image.fromarray(data, mode="L").convert("P")
+        palette.putpalette([0, 0, 0, 255, 0, 0] + [0] * 762)
+        images = {
+            "P": palette,
+            "1": PIL.Image.fromarray(data > 0),
+            "I;16": PIL.Image.fromarray(data.astype(np.uint16) * 1000),
+        }
+        expected = {
+            "P": ((300, 400, 3), [255, 0, 0]),
+            "1": ((300, 400), 255),
+            "I;16": ((300, 400), 1000),
+        }
+        for mode, pil_img in images.items():
+            with self.subTest(mode=mode):
+                filepath = join(self.tmp_dir, f"img_{len(mode)}.png")
+                pil_img.save(filepath)
+                img = ImageFile(filepath=filepath)
+                self.assertEqual(img.mode, mode)
+                level = img.pyramid_level(1)
+                shape, value = expected[mode]
+                self.assertEqual(level.shape, shape)
+                np.testing.assert_array_equal(level[0, 0], value)
+                # The full resolution is converted the same way
+                self.assertEqual(img.pyramid_level(0).shape[2:], shape[2:])
+
+    def test_no_image_file(self):
+        img = ImageFile(filepath=__file__)
+        self.assertEqual(img.num_pyramid_levels, 1)
+        self.assertEqual(img.pyramid_level(0).shape, (0,))
@@ -1,9 +1,22 @@
+import os
 from os.path import dirname, join
-from unittest import TestCase
+from shutil import copy, rmtree
+from tempfile import mkdtemp
+from unittest import skipUnless, TestCase
 
+import numpy as np
 import pandas as pd
+import PIL.Image
+from traits_futures.api import CANCELLED, CANCELLING, TraitsExecutor
+from traits_futures.testing.test_assistant import TestAssistant
 
-from pycasa.model.image_folder import ImageFolder
+from pycasa.model.batch_detection import detect_faces_batch
+from pycasa.model.faces import FACE_DTYPE, FOLDER_FACE_DTYPE
+from pycasa.model.image_folder import (
+    FILENAME_COL, ImageFolder,
+    iter_faces_parallel, iter_image_files, list_image_files, NUM_FACE_COL,
+    read_images_metadata, RELPATH_COL
+)
 
 import ets_tutorial
 
@@ -11,9 +24,20 @@ TUTORIAL_DIR = dirname(ets_tutorial.__file__)
 
 SAMPLE_IMG_DIR = join(TUTORIAL_DIR, "..", "sample_images")
 
+SAMPLE_IMG1 = join(SAMPLE_IMG_DIR, "IMG-0311_xmas_2020.JPG")
+
 HERE = dirname(__file__)
 
 
+def make_image_dir(num_images=3):
+    """ Create a temporary folder with copies of a small sample image.
+    """
+    directory = mkdtemp()
+    for i in range(num_images):
+        copy(SAMPLE_IMG1, join(directory, f"img_{i}.jpg"))
+    return directory
+
+
 class TestImageFolder(TestCase):
     def test_no_folder(self):
         with self.assertRaises(ValueError):
@@ -30,6 +54,419 @@ class TestImageFolder(TestCase):
 
     def test_real_folder(self):
         img_folder = ImageFolder(directory=SAMPLE_IMG_DIR)
-        self.assertEqual(len(img_folder.data), 4)
+        self.assertEqual(len(img_folder.data), 3)
         for key in ['ExifVersion', 'ExifImageWidth', 'ExifImageHeight']:
             self.assertIn(key, img_folder.data.columns)
+
+    def test_read_images_metadata(self):
+        img_folder = ImageFolder(directory=SAMPLE_IMG_DIR)
+        metadata = read_images_metadata(img_folder.images, max_workers=2)
+        self.assertEqual(metadata,
+                         [img.metadata for img in img_folder.images])
+
+
+class TestListImageFiles(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_single_pass_listing(self):
+        for filename in ["b.JPG", "a.png", "c.Jpeg", "notes.txt"]:
+            copy(SAMPLE_IMG1, join(self.directory, filename))
+        os.mkdir(join(self.directory, "folder.jpg"))
+
+        image_files = list_image_files(self.directory)
+        filepaths = [filepath for filepath, _ in image_files]
+        self.assertEqual(filepaths, [
+            join(self.directory, filename)
+            for filename in ["a.png", "b.JPG", "c.Jpeg"]
+        ])
+        for filepath, signature in image_files:
+            stat = os.stat(filepath)
+            self.assertEqual(signature,
+                             (stat.st_size, stat.st_mtime_ns, stat.st_ino))
+
+    def test_images_signatures(self):
+        copy(SAMPLE_IMG1, join(self.directory, "img.jpg"))
+        img_folder = ImageFolder(directory=self.directory)
+        self.assertEqual(len(img_folder.images), 1)
+        self.assertEqual(img_folder.images[0].signature[0],
+                         os.path.getsize(SAMPLE_IMG1))
+
+
+class TestRecursiveFolder(TestCase):
+    def setUp(self):
+        # Tree: a.jpg, 2021/b.jpg, 2021/xmas/c.png, 2021/.thumbs/d.jpg
+        self.directory = mkdtemp()
+        for rel_path in ["a.jpg", "2021/b.jpg", "2021/xmas/c.png",
+                         "2021/.thumbs/d.jpg"]:
+            filepath = join(self.directory, *rel_path.split("/"))
+            os.makedirs(dirname(filepath), exist_ok=True)
+            copy(SAMPLE_IMG1, filepath)
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def rel_paths(self, batches):
+        return sorted(
+            os.path.relpath(filepath, self.directory).replace(os.sep, "/")
+            for batch in batches for filepath, _ in batch
+        )
+
+    def test_iter_image_files(self):
+        batches = list(iter_image_files(self.directory, max_workers=2))
+        self.assertEqual(self.rel_paths(batches), [
+            "2021/.thumbs/d.jpg", "2021/b.jpg", "2021/xmas/c.png", "a.jpg"
+        ])
+
+    def test_iter_image_files_batches(self):
+        batches = list(iter_image_files(self.directory, batch_size=100))
+        self.assertEqual(len(batches), 1)
+        batches = list(iter_image_files(self.directory, batch_size=1))
+        self.assertTrue(all(batches))
+        self.assertEqual(len(self.rel_paths(batches)), 4)
+
+    def test_iter_image_files_max_depth(self):
+        batches = iter_image_files(self.directory, max_depth=1)
+        self.assertEqual(self.rel_paths(batches), ["2021/b.jpg", "a.jpg"])
+
+    def test_iter_image_files_patterns(self):
+        batches = iter_image_files(self.directory, include=["*.jpg"],
+                                   exclude=["*/.thumbs"])
+        self.assertEqual(self.rel_paths(batches), ["2021/b.jpg", "a.jpg"])
+
+    def test_recursive_folder(self):
+        img_folder = ImageFolder(directory=self.directory, recursive=True,
+                                 exclude=["*/.thumbs"])
+        self.assertEqual(img_folder.data[RELPATH_COL].tolist(), [
+            join("2021", "b.jpg"), join("2021", "xmas", "c.png"), "a.jpg"
+        ])
+        self.assertIn("ExifVersion", img_folder.data.columns)
+
+        img_folder.recursive = False
+        self.assertEqual(img_folder.data[RELPATH_COL].tolist(), ["a.jpg"])
+
+    def test_flat_folder_patterns(self):
+        copy(SAMPLE_IMG1, join(self.directory, "b.jpg"))
+        img_folder = ImageFolder(directory=self.directory, exclude=["b.*"])
+        self.assertEqual(img_folder.data[RELPATH_COL].tolist(), ["a.jpg"])
+        img_folder.exclude = []
+        img_folder.include = ["b.*"]
+        self.assertEqual(img_folder.data[RELPATH_COL].tolist(), ["b.jpg"])
+
+
+class TestRefresh(TestCase):
+    def setUp(self):
+        self.directory = make_image_dir()
+        self.img_folder = ImageFolder(directory=self.directory)
+        self.changes = []
+        self.img_folder.observe(
+            lambda event: self.changes.append(event.new), "rows_changed"
+        )
+        self.data_replaced = []
+        self.img_folder.observe(self.data_replaced.append, "data")
+        col = self.img_folder.data.columns.get_loc(NUM_FACE_COL)
+        for idx in range(3):
+            self.img_folder.data.iat[idx, col] = idx
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_no_change(self):
+        data = self.img_folder.data
+        images = list(self.img_folder.images)
+        self.img_folder.refresh()
+        self.assertEqual(self.changes, [])
+        self.assertIs(self.img_folder.data, data)
+        self.assertEqual(self.img_folder.images, images)
+
+    def test_changes_in_place(self):
+        kept_image = self.img_folder.images[0]
+        os.remove(join(self.directory, "img_1.jpg"))
+        stat = os.stat(join(self.directory, "img_2.jpg"))
+        os.utime(join(self.directory, "img_2.jpg"),
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        copy(SAMPLE_IMG1, join(self.directory, "img_3.jpg"))
+
+        self.img_folder.refresh()
+
+        # rows_changed is fired, and data since a row was appended
+        self.assertEqual(len(self.changes), 1)
+        data = self.img_folder.data
+        self.assertEqual([event.new for event in self.data_replaced], [data])
+        self.assertIs(self.img_folder.images[0], kept_image)
+        self.assertEqual(data[FILENAME_COL].tolist(),
+                         ["img_0.jpg", "img_2.jpg", "img_3.jpg"])
+        self.assertEqual(data.index.tolist(), [0, 1, 2])
+        self.assertEqual(
+            [os.path.basename(img.filepath) for img in self.img_folder.images],
+            data[FILENAME_COL].tolist()
+        )
+        # Only the unchanged image keeps its face count
+        self.assertEqual(data[NUM_FACE_COL].iloc[0], 0)
+        self.assertTrue(data[NUM_FACE_COL].iloc[1:].isna().all())
+        self.assertEqual(data["ExifVersion"].notna().sum(), 3)
+
+        [change] = self.changes
+        self.assertEqual(change.added, [join(self.directory, "img_3.jpg")])
+        self.assertEqual(change.removed, [join(self.directory, "img_1.jpg")])
+        self.assertEqual(change.updated, [join(self.directory, "img_2.jpg")])
+
+
+class TestParallelScan(TestCase):
+    def setUp(self):
+        self.directory = make_image_dir()
+        self.img_folder = ImageFolder(directory=self.directory)
+        self.filepaths = [img.filepath for img in self.img_folder.images]
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_iter_faces_parallel_batches(self):
+        batches = list(iter_faces_parallel(self.filepaths, max_workers=2,
+                                           chunk_size=2))
+        self.assertEqual(sorted(len(batch) for batch in batches), [1, 2])
+        indices = sorted(idx for batch in batches for idx, _ in batch)
+        self.assertEqual(indices, [0, 1, 2])
+        for batch in batches:
+            for _, faces in batch:
+                self.assertEqual(faces.dtype, FACE_DTYPE)
+
+    def test_iter_faces_parallel_indices(self):
+        batches = list(iter_faces_parallel(self.filepaths[1:],
+                                           indices=[5, 7], max_workers=2,
+                                           chunk_size=1))
+        indices = sorted(idx for batch in batches for idx, _ in batch)
+        self.assertEqual(indices, [5, 7])
+
+
+def current_rss():
+    """ Resident memory of the process in bytes (Linux only).
+    """
+    with open("/proc/self/statm") as fp:
+        return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+@skipUnless(os.path.exists("/proc/self/statm"), "Needs /proc/self/statm")
+class TestScanMemory(TestCase):
+    def setUp(self):
+        # Synthetic 512x512 images, searched for large faces only to keep
+        # the test fast: keeping their pixels would take 256 MB.
+        self.directory = mkdtemp()
+        y, x = np.mgrid[:512, :512]
+        pattern = ((7 * x + 3 * y) % 256).astype(np.uint8)
+        src = join(self.directory, "src.jpg")
+        PIL.Image.fromarray(pattern).convert("RGB").save(src)
+        self.filepaths = [
+            copy(src, join(self.directory, f"img_{i}.jpg"))
+            for i in range(1000)
+        ]
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_rss_flat_across_scan(self):
+        kwargs = dict(min_size=(400, 400), max_size=(512, 512))
+        detect_faces_batch(self.filepaths[:100], **kwargs)
+        rss_start = current_rss()
+        for i in range(100, 1000, 100):
+            detect_faces_batch(self.filepaths[i:i + 100], **kwargs)
+        self.assertLess(current_rss() - rss_start, 32 * 2**20)
+
+
+class TestBackgroundScan(TestAssistant, TestCase):
+    def setUp(self):
+        TestAssistant.setUp(self)
+        self.executor = TraitsExecutor(event_loop=self._event_loop)
+        self.directory = make_image_dir()
+
+    def tearDown(self):
+        self.executor.shutdown()
+        rmtree(self.directory)
+        TestAssistant.tearDown(self)
+
+    def test_background_metadata(self):
+        img_folder = ImageFolder(directory=self.directory,
+                                 traits_executor=self.executor)
+        self.assertTrue(img_folder.loading_metadata)
+        self.assertEqual(len(img_folder.data), 3)
+        self.assertEqual(set(img_folder.data.columns),
+                         {FILENAME_COL, RELPATH_COL, NUM_FACE_COL})
+
+        self.run_until(img_folder, "loading_metadata",
+                       lambda obj: not obj.loading_metadata)
+        self.assertEqual(len(img_folder.data), 3)
+        self.assertIn("ExifVersion", img_folder.data.columns)
+
+    def test_face_counts_kept_when_metadata_loaded(self):
+        img_folder = ImageFolder(directory=self.directory,
+                                 traits_executor=self.executor)
+        self.assertTrue(img_folder.loading_metadata)
+        img_folder.data.loc[1, NUM_FACE_COL] = 7
+        # Rows can't be refreshed in place until the metadata is loaded
+        copy(SAMPLE_IMG1, join(self.directory, "img_3.jpg"))
+        self.assertIsNone(img_folder.refresh())
+
+        self.run_until(img_folder, "loading_metadata",
+                       lambda obj: not obj.loading_metadata)
+        self.assertIn("ExifVersion", img_folder.data.columns)
+        self.assertEqual(img_folder.data[NUM_FACE_COL].tolist()[1], 7)
+        self.assertEqual(len(img_folder.data), 3)
+
+    def test_cancel_metadata(self):
+        img_folder = ImageFolder(directory=self.directory,
+                                 traits_executor=self.executor)
+        img_folder.cancel_metadata()
+        self.run_until(img_folder, "loading_metadata",
+                       lambda obj: not obj.loading_metadata)
+        self.assertEqual(img_folder.metadata_future.state, CANCELLED)
+        self.assertEqual(len(img_folder.data), 3)
+        self.assertNotIn("ExifVersion", img_folder.data.columns)
+
+    def test_metadata_of_previous_images_dropped(self):
+        img_folder = ImageFolder(directory=self.directory,
+                                 traits_executor=self.executor)
+        future = img_folder.metadata_future
+        directory = make_image_dir(num_images=2)
+        self.addCleanup(rmtree, directory)
+        os.mkdir(join(directory, "sub"))
+        copy(SAMPLE_IMG1, join(directory, "sub", "img.jpg"))
+        img_folder.trait_set(directory=directory, recursive=True)
+        self.assertTrue(future.done or future.state == CANCELLING)
+        self.run_until(img_folder, "loading_metadata",
+                       lambda obj: not obj.loading_metadata)
+        self.assertEqual(len(img_folder.images), 3)
+        self.assertEqual(img_folder.data[RELPATH_COL].tolist(), [
+            "img_0.jpg", "img_1.jpg", join("sub", "img.jpg")
+        ])
+        self.assertEqual(img_folder.data["ExifVersion"].notna().sum(), 3)
+
+    def test_streamed_listing(self):
+        os.mkdir(join(self.directory, "sub"))
+        copy(SAMPLE_IMG1, join(self.directory, "sub", "img.jpg"))
+        img_folder = ImageFolder(directory=self.directory, recursive=True,
+                                 traits_executor=self.executor)
+        self.assertTrue(img_folder.listing_images)
+        self.assertTrue(img_folder.loading_metadata)
+        self.run_until(img_folder, "loading_metadata",
+                       lambda obj: not obj.loading_metadata)
+        self.assertFalse(img_folder.listing_images)
+        self.assertEqual(len(img_folder.images), 4)
+        self.assertEqual(len(img_folder.data), 4)
+        self.assertEqual(img_folder.data[RELPATH_COL].iloc[-1],
+                         join("sub", "img.jpg"))
+        self.assertIn("ExifVersion", img_folder.data.columns)
+
+    def test_scan_requested_while_listing(self):
+        os.mkdir(join(self.directory, "sub"))
+        copy(SAMPLE_IMG1, join(self.directory, "sub", "img.jpg"))
+        img_folder = ImageFolder(directory=self.directory, recursive=True,
+                                 traits_executor=self.executor)
+        img_folder.compute_num_faces_background(resume=True)
+        # The scan starts once all images are listed and their metadata read
+        self.assertIsNone(img_folder.future)
+        self.run_until(img_folder, "num_scanned",
+                       lambda obj: obj.num_scanned == 4)
+        self.assertEqual(img_folder.num_to_scan, 4)
+        self.run_until(img_folder, "executor_idle",
+                       lambda obj: obj.executor_idle)
+        self.assertFalse(img_folder.data[NUM_FACE_COL].isna().any())
+
+    def test_streamed_results(self):
+        img_folder = ImageFolder(directory=self.directory,
+                                 traits_executor=self.executor)
+        self.run_until(img_folder, "loading_metadata",
+                       lambda obj: not obj.loading_metadata)
+        updates = []
+        img_folder.observe(
+            lambda event: updates.append(img_folder.num_scanned),
+            "data_updated"
+        )
+        img_folder.compute_num_faces_background()
+        self.assertFalse(img_folder.executor_idle)
+        self.run_until(img_folder, "executor_idle",
+                       lambda obj: obj.executor_idle)
+
+        self.assertEqual(updates, [1, 2, 3])
+        self.assertEqual(img_folder.num_scanned, 3)
+        self.assertEqual(img_folder.scan_eta, 0)
+        self.assertFalse(np.isnan(img_folder.data[NUM_FACE_COL]).any())
+
+        # All faces found, in one array, by image
+        faces = img_folder.all_faces()
+        self.assertEqual(faces.dtype, FOLDER_FACE_DTYPE)
+        self.assertEqual(len(faces), img_folder.data[NUM_FACE_COL].sum())
+        np.testing.assert_array_equal(
+            np.bincount(faces["image"], minlength=3),
+            img_folder.data[NUM_FACE_COL]
+        )
+
+    def test_cancel_and_resume(self):
+        directory = make_image_dir(num_images=6)
+        self.addCleanup(rmtree, directory)
+        img_folder = ImageFolder(directory=directory,
+                                 traits_executor=self.executor)
+        self.run_until(img_folder, "loading_metadata",
+                       lambda obj: not obj.loading_metadata)
+        img_folder.compute_num_faces_background()
+        self.run_until(img_folder, "num_scanned",
+                       lambda obj: obj.num_scanned > 0)
+        img_folder.cancel_scan()
+        self.run_until(img_folder, "executor_idle",
+                       lambda obj: obj.executor_idle)
+        self.assertEqual(img_folder.future.state, CANCELLED)
+        num_missing = img_folder.data[NUM_FACE_COL].isna().sum()
+        self.assertGreater(num_missing, 0)
+        self.assertLess(num_missing, 6)
+
+        img_folder.compute_num_faces_background(resume=True)
+        self.assertEqual(img_folder.num_to_scan, num_missing)
+        self.run_until(img_folder, "executor_idle",
+                       lambda obj: obj.executor_idle)
+        self.assertEqual(img_folder.num_scanned, num_missing)
+        self.assertFalse(img_folder.data[NUM_FACE_COL].isna().any())
+
+    def test_nothing_to_resume(self):
+        img_folder = ImageFolder(directory=self.directory,
+                                 traits_executor=self.executor)
+        self.run_until(img_folder, "loading_metadata",
+                       lambda obj: not obj.loading_metadata)
+        img_folder.data[NUM_FACE_COL] = 0.
+        idle = []
+        img_folder.observe(lambda event: idle.append(event.new),
+                           "executor_idle")
+        img_folder.compute_num_faces_background(resume=True)
+        self.assertEqual(img_folder.num_to_scan, 0)
+        # The end of the scan is notified, even without any image scanned
+        self.run_until(img_folder, "executor_idle",
+                       lambda obj: obj.executor_idle)
+        self.assertEqual(idle, [False, True])
+
+    def test_results_of_modified_images_dropped(self):
+        img_folder = ImageFolder(directory=self.directory,
+                                 traits_executor=self.executor)
+        self.run_until(img_folder, "loading_metadata",
+                       lambda obj: not obj.loading_metadata)
+        img_folder.compute_num_faces_background()
+        # Modified before any result is received
+        stat = os.stat(join(self.directory, "img_1.jpg"))
+        os.utime(join(self.directory, "img_1.jpg"),
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        img_folder.refresh()
+        self.run_until(img_folder, "executor_idle",
+                       lambda obj: obj.executor_idle)
+
+        self.assertEqual(img_folder.num_scanned, 3)
+        num_faces = img_folder.data[NUM_FACE_COL]
+        self.assertEqual(num_faces.isna().tolist(), [False, True, False])
+        self.assertEqual(len(img_folder.images[1].faces), 0)
+
+    def test_cancel_without_scan(self):
+        img_folder = ImageFolder(directory=self.directory,
+                                 traits_executor=self.executor)
+        img_folder.cancel_scan()
+        self.assertTrue(img_folder.executor_idle)
+        self.run_until(img_folder, "loading_metadata",
+                       lambda obj: not obj.loading_metadata)
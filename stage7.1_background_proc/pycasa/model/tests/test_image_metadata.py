@@ -0,0 +1,86 @@
+from os.path import dirname, join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import mock, TestCase
+
+import numpy as np
+import PIL.Image
+from PIL.ExifTags import TAGS
+from PIL.PngImagePlugin import PngInfo
+
+from pycasa.model.image_metadata import read_metadata
+
+import ets_tutorial
+
+TUTORIAL_DIR = dirname(ets_tutorial.__file__)
+
+SAMPLE_IMG_DIR = join(TUTORIAL_DIR, "..", "sample_images")
+
+SAMPLE_IMG1 = join(SAMPLE_IMG_DIR, "IMG-0311_xmas_2020.JPG")
+
+
+def pil_metadata(filepath):
+    """ Metadata as read by decoding the image with PIL.
+    """
+    with PIL.Image.open(filepath) as img:
+        exif = img._getexif()
+    return {TAGS[k]: v for k, v in exif.items() if k in TAGS}
+
+
+class TestReadMetadata(TestCase):
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def test_jpeg_same_as_pil(self):
+        metadata = read_metadata(SAMPLE_IMG1)
+        self.assertIn("ExifVersion", metadata)
+        self.assertEqual(metadata, pil_metadata(SAMPLE_IMG1))
+
+    def test_jpeg_no_pixel_decoding(self):
+        with mock.patch("PIL.Image.open", side_effect=AssertionError):
+            metadata = read_metadata(SAMPLE_IMG1)
+        self.assertIn("ExifImageWidth", metadata)
+
+    def test_jpeg_header_only(self):
+        # Only the header is read: a file truncated right after it works.
+        with open(SAMPLE_IMG1, "rb") as fp:
+            content = fp.read()
+        header_size = content.index(b"\xff\xda")
+        filepath = join(self.tmp_dir, "truncated.jpg")
+        with open(filepath, "wb") as fp:
+            fp.write(content[:header_size + 2])
+        self.assertEqual(read_metadata(filepath), read_metadata(SAMPLE_IMG1))
+
+    def test_png_text_and_exif(self):
+        exif = PIL.Image.Exif()
+        exif[0x0110] = "PNG camera"  # Model
+        info = PngInfo()
+        info.add_text("Title", "Party")
+        info.add_text("Comment", "zipped", zip=True)
+        info.add_itxt("Author", "Zoë")
+        filepath = join(self.tmp_dir, "img.png")
+        img = PIL.Image.fromarray(np.zeros((10, 10, 3), dtype=np.uint8))
+        img.save(filepath, pnginfo=info, exif=exif)
+
+        with mock.patch("PIL.Image.open", side_effect=AssertionError):
+            metadata = read_metadata(filepath)
+        self.assertEqual(metadata, {
+            "Model": "PNG camera", "Title": "Party", "Comment": "zipped",
+            "Author": "Zoë"
+        })
+
+    def test_no_metadata(self):
+        filepath = join(self.tmp_dir, "img.jpg")
+        img = PIL.Image.fromarray(np.zeros((10, 10, 3), dtype=np.uint8))
+        img.save(filepath)
+        self.assertEqual(read_metadata(filepath), {})
+
+    def test_not_an_image(self):
+        self.assertEqual(read_metadata(__file__), {})
+        filepath = join(self.tmp_dir, "fake.jpg")
+        with open(filepath, "w") as fp:
+            fp.write("not an image")
+        self.assertEqual(read_metadata(filepath), {})
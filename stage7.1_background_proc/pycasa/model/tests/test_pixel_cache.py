@@ -0,0 +1,88 @@
+from os.path import dirname, join
+from unittest import TestCase
+
+import numpy as np
+
+from pycasa.model.image_file import ImageFile
+from pycasa.model.pixel_cache import get_pixel_cache, PixelCache
+
+import ets_tutorial
+
+TUTORIAL_DIR = dirname(ets_tutorial.__file__)
+
+SAMPLE_IMG_DIR = join(TUTORIAL_DIR, "..", "sample_images")
+
+SAMPLE_IMG1 = join(SAMPLE_IMG_DIR, "IMG-0311_xmas_2020.JPG")
+
+MB = 2**20
+
+
+def make_array(num_mb=1):
+    return np.zeros(num_mb * MB, dtype=np.uint8)
+
+
+class TestPixelCache(TestCase):
+    def test_hits_and_misses(self):
+        cache = PixelCache()
+        array = make_array()
+        self.assertIs(cache.get("a", lambda: array), array)
+        self.assertIs(cache.get("a", make_array), array)
+        self.assertEqual(cache.stats(), {
+            "hits": 1, "misses": 1, "evictions": 0, "num_arrays": 1,
+            "num_bytes": MB, "max_bytes": cache.max_size_mb * MB,
+        })
+
+    def test_least_recently_used_evicted(self):
+        cache = PixelCache(max_size_mb=2)
+        cache.get("a", make_array)
+        cache.get("b", make_array)
+        cache.get("a", make_array)
+        cache.get("c", make_array)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.num_bytes, 2 * MB)
+
+        # "b" was evicted and is decoded again, evicting "a"
+        cache.get("b", make_array)
+        self.assertEqual(cache.misses, 4)
+        cache.get("c", make_array)
+        self.assertEqual(cache.hits, 2)
+
+    def test_array_larger_than_budget(self):
+        cache = PixelCache(max_size_mb=1)
+        array = cache.get("a", lambda: make_array(2))
+        self.assertEqual(array.nbytes, 2 * MB)
+        self.assertEqual(cache.num_bytes, 0)
+
+    def test_reduced_budget(self):
+        cache = PixelCache(max_size_mb=3)
+        for key in "abc":
+            cache.get(key, make_array)
+        cache.max_size_mb = 1
+        self.assertEqual(cache.num_bytes, MB)
+        self.assertEqual(cache.evictions, 2)
+
+    def test_clear(self):
+        cache = PixelCache()
+        cache.get("a", make_array)
+        cache.clear()
+        self.assertEqual(cache.num_bytes, 0)
+        cache.get("a", make_array)
+        self.assertEqual(cache.misses, 2)
+
+    def test_shared_by_image_files(self):
+        self.assertIs(ImageFile().pixel_cache, get_pixel_cache())
+        cache = PixelCache()
+        img = ImageFile(filepath=SAMPLE_IMG1, pixel_cache=cache)
+        other = ImageFile(filepath=SAMPLE_IMG1, pixel_cache=cache)
+        self.assertIs(img.data, other.data)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.num_bytes, img.data.nbytes)
+
+    def test_image_data_decoded_again(self):
+        cache = PixelCache(max_size_mb=3)
+        img = ImageFile(filepath=SAMPLE_IMG1, pixel_cache=cache)
+        data = img.data
+        img.data_at(256)
+        cache.get("other", lambda: make_array(2))
+        np.testing.assert_array_equal(img.data, data)
+        self.assertEqual(cache.misses, 4)
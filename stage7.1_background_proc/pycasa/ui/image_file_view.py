@@ -1,18 +1,34 @@
 # General imports
+from matplotlib.collections import PatchCollection
 from matplotlib.figure import Figure
+from matplotlib.image import AxesImage
 from matplotlib import patches
+import numpy as np
 
 # ETS imports
-from traits.api import Button, Instance, observe
+from traits.api import Button, Instance, Int, observe
 from traitsui.api import HGroup, Item, ModelView, Spring, View
 
 # Local imports
-from ets_tutorial.util.mpl_figure_editor import MplFigureEditor
+from ets_tutorial.util.mpl_figure_editor import BlitOverlay, MplFigureEditor
 from ..model.image_file import ImageFile
 
 
 class ImageFileView(ModelView):
     """ ModelView for an image file object.
+
+    A single figure is built for the lifetime of the view: the image and the
+    face rectangles are updated in place, and the figure redrawn. Since the
+    figure trait never changes, the figure editor keeps its canvas.
+
+    The image is displayed from the level of the model's display pyramid
+    closest to the screen resolution, in full resolution coordinates: a
+    finer level is swapped in when zooming in, and panning only resamples
+    the level displayed.
+
+    Face rectangles, and the outline of the face under the mouse pointer,
+    are drawn on a blitted overlay: updating them doesn't render the image
+    again.
     """
     model = Instance(ImageFile)
 
@@ -20,6 +36,21 @@ class ImageFileView(ModelView):
 
     detect_button = Button("Detect faces")
 
+    #: Artist displaying the image data
+    _image = Instance(AxesImage)
+
+    #: Display pyramid level shown (see ImageFile.pyramid_level), -1 if none
+    _level = Int(-1)
+
+    #: Artist drawing all the face rectangles at once
+    _faces_collection = Instance(PatchCollection)
+
+    #: Outline of the face under the mouse pointer
+    _highlight = Instance(patches.Rectangle)
+
+    #: Layer of the artists drawn over the image
+    _overlay = Instance(BlitOverlay)
+
     view = View(
         Item("model.filepath", style="readonly", show_label=False),
         Item("figure", editor=MplFigureEditor(), show_label=False),
@@ -32,10 +63,26 @@ class ImageFileView(ModelView):
 
     @observe("model.filepath")
     def build_mpl_figure(self, event):
-        figure = Figure()
-        axes = figure.add_subplot(111)
-        axes.imshow(self.model.data)
-        self.figure = figure
+        height, width = self.model.shape[:2]
+        extent = (-0.5, width - 0.5, height - 0.5, -0.5)
+        self._level = -1
+        if self._image is None:
+            self._level = self._pyramid_level_for(width, height)
+            self._image = self._axes.imshow(
+                self.model.pyramid_level(self._level), extent=extent
+            )
+            for name in ["xlim_changed", "ylim_changed"]:
+                self._axes.callbacks.connect(name, self._update_level)
+            # Stored by the figure: survives changes of canvas
+            canvas = self.figure.canvas
+            canvas.mpl_connect("resize_event", self._update_level)
+            canvas.mpl_connect("motion_notify_event", self._highlight_face)
+        else:
+            self._image.set_extent(extent)
+            self._update_level()
+        self._highlight.set_visible(False)
+        self._set_faces()
+        self.figure.canvas.draw_idle()
 
     @observe("detect_button")
     def _detect_button_fired(self, event):
@@ -43,19 +90,98 @@ class ImageFileView(ModelView):
 
     @observe("model.faces")
     def update_mpl_figure_with_faces(self, events):
-        figure = Figure()
-        axes = figure.add_subplot(111)
-        axes.imshow(self.model.data)
-
-        for face in self.model.faces:
-            axes.add_patch(
-                patches.Rectangle(
-                    (face['c'], face['r']),
-                    face['width'],
-                    face['height'],
-                    fill=False,
-                    color='r',
-                    linewidth=2
+        self._set_faces()
+        self._highlight.set_visible(False)
+        self._overlay.update()
+
+    def _set_faces(self):
+        """ Replace the face rectangles by the model's faces.
+        """
+        if self._faces_collection is not None:
+            self._overlay.discard(self._faces_collection)
+            self._faces_collection = None
+
+        faces = self.model.faces
+        if len(faces):
+            rectangles = [
+                patches.Rectangle((c, r), width, height)
+                for c, r, width, height in zip(faces['c'], faces['r'],
+                                               faces['width'],
+                                               faces['height'])
+            ]
+            self._faces_collection = self._overlay.add(
+                self._axes.add_collection(
+                    PatchCollection(rectangles, facecolor="none",
+                                    edgecolor='r', linewidth=2),
+                    autolim=False
                 )
             )
-        self.figure = figure
+
+    def _highlight_face(self, event):
+        """ Outline the (smallest) face under the mouse pointer, if any.
+        """
+        faces = self.model.faces
+        inside = np.zeros(len(faces), dtype=bool)
+        if event.inaxes is self._axes:
+            x, y = event.xdata, event.ydata
+            inside = (
+                (faces["c"] <= x) & (x < faces["c"] + faces["width"]) &
+                (faces["r"] <= y) & (y < faces["r"] + faces["height"])
+            )
+
+        if not inside.any():
+            if not self._highlight.get_visible():
+                return
+            self._highlight.set_visible(False)
+        else:
+            candidates = faces[inside]
+            face = candidates[np.argmin(candidates["width"])]
+            bounds = (face["c"], face["r"], face["width"], face["height"])
+            if self._highlight.get_visible() and \
+                    self._highlight.get_bbox().bounds == bounds:
+                return
+            self._highlight.set_bounds(*bounds)
+            self._highlight.set_visible(True)
+        self._overlay.update()
+
+    def _update_level(self, *args):
+        """ Display the pyramid level matching the current view limits and
+        axes size, if it's not displayed yet.
+        """
+        x_min, x_max = self._axes.get_xlim()
+        y_min, y_max = self._axes.get_ylim()
+        level = self._pyramid_level_for(abs(x_max - x_min),
+                                        abs(y_max - y_min))
+        if level != self._level:
+            self._level = level
+            self._image.set_data(self.model.pyramid_level(level))
+
+    def _pyramid_level_for(self, view_width, view_height):
+        """ Coarsest pyramid level with at least one pixel per screen pixel
+        for a view of the provided size, in image pixels.
+        """
+        bbox = self._axes.get_window_extent()
+        if bbox.width < 1 or bbox.height < 1:
+            return self.model.num_pyramid_levels - 1
+        pixels_per_dot = min(view_width / bbox.width,
+                             view_height / bbox.height)
+        level = int(np.log2(max(pixels_per_dot, 1)))
+        return min(level, self.model.num_pyramid_levels - 1)
+
+    @property
+    def _axes(self):
+        return self.figure.axes[0]
+
+    def _figure_default(self):
+        figure = Figure()
+        figure.add_subplot(111)
+        return figure
+
+    def __overlay_default(self):
+        return BlitOverlay(self.figure)
+
+    def __highlight_default(self):
+        return self._overlay.add(self._axes.add_patch(
+            patches.Rectangle((0, 0), 0, 0, fill=False, color="y",
+                              linewidth=3, visible=False)
+        ))
@@ -25,6 +25,16 @@ class ImageFolderEditor(Editor):
         # Grab the Qt widget to return to the editor area
         self.control = ui.control
 
+    def destroy(self):
+        """ Destroy the toolkit-specific control that represents the editor,
+        stopping any face scan running on the folder, the reading of its
+        images' metadata and the watch for changes to its image files.
+        """
+        self.obj.cancel_scan()
+        self.obj.cancel_metadata()
+        self.obj.watch = False
+        super().destroy()
+
     # -------------------------------------------------------------------------
     # Traits property methods
     # -------------------------------------------------------------------------
@@ -3,16 +3,20 @@
 # ETS imports
 import numpy as np
 import pandas as pd
-from traits.api import Bool, Button, Enum, Instance, List, observe
+from traits.api import (
+    Bool, Button, ComparisonMode, Enum, Event, Instance, List, observe
+)
 from traitsui.api import HGroup, Item, Label, ListStrEditor, ModelView, \
     Spring, View
-from traitsui.ui_editors.data_frame_editor import DataFrameEditor
 
 # Local imports
-from pycasa.model.image_folder import FILENAME_COL, ImageFolder, NUM_FACE_COL
+from ets_tutorial.util.data_frame_table_editor import DataFrameTableEditor
+from pycasa.model.image_folder import (
+    FILENAME_COL, ImageFolder, NUM_FACE_COL, RELPATH_COL
+)
 
 
-DISPLAYED_COLUMNS = [FILENAME_COL, NUM_FACE_COL] + [
+DISPLAYED_COLUMNS = [FILENAME_COL, RELPATH_COL, NUM_FACE_COL] + [
     'ApertureValue', 'ExifVersion', 'Model', 'Make', 'LensModel', 'DateTime',
     'ShutterSpeedValue', 'ExposureTime', 'XResolution', 'YResolution',
     'Orientation', 'GPSInfo', 'DigitalZoomRatio', 'FocalLengthIn35mmFilm',
@@ -33,14 +37,28 @@ class ImageFolderView(ModelView):
 
     scan = Button("Scan for faces...")
 
+    cancel_scan = Button("Cancel scan")
+
+    # Whether scans skip the images already scanned, e.g. by a cancelled
+    # scan or a previous session
+    skip_scanned = Bool(True)
+
+    refresh = Button("Refresh")
+
     # Filters widgets
     view_filter_controls = Bool
 
     # Copy of the model's data, with filtering columns added if missing
     all_data = Instance(pd.DataFrame)
 
-    # Filtered dataframe based on filtering widgets
-    filtered_data = Instance(pd.DataFrame)
+    # Filtered dataframe based on filtering widgets. Notify on every
+    # assignment: without filters, it's all_data, updated in place.
+    filtered_data = Instance(pd.DataFrame,
+                             comparison_mode=ComparisonMode.none)
+
+    # Fired with the index labels of the rows of filtered_data updated in
+    # place, e.g. with the face counts of a scan
+    filtered_rows_updated = Event
 
     year_mask = Instance(pd.Series)
 
@@ -54,8 +72,15 @@ class ImageFolderView(ModelView):
 
     def traits_view(self):
         view = View(
-            Item("model.directory", style="readonly", show_label=False),
             HGroup(
+                Item("model.directory", style="readonly", show_label=False),
+                Item("refresh", show_label=False,
+                     enabled_when="not model.loading_metadata"),
+            ),
+            HGroup(
+                Item("model.watch", label="Watch for changes"),
+                Item("model.auto_scan", label="Scan new images",
+                     enabled_when="model.watch"),
                 Spring(),
                 Item("view_filter_controls"),
             ),
@@ -68,8 +93,17 @@ class ImageFolderView(ModelView):
                 visible_when="view_filter_controls",
             ),
             Item("filtered_data",
-                 editor=DataFrameEditor(columns=DISPLAYED_COLUMNS),
+                 editor=DataFrameTableEditor(
+                     columns=DISPLAYED_COLUMNS,
+                     rows_updated="filtered_rows_updated",
+                 ),
                  show_label=False, visible_when="len(model.data) > 0"),
+            HGroup(
+                Spring(),
+                Label("Loading image metadata..."),
+                Spring(),
+                visible_when="model.loading_metadata",
+            ),
             HGroup(
                 Spring(),
                 Label("No images found. No data to show"),
@@ -81,7 +115,14 @@ class ImageFolderView(ModelView):
                 Item(
                     "scan",
                     show_label=False,
-                    enabled_when="len(model.data) > 0 and model.executor_idle"
+                    enabled_when="len(model.data) > 0 and model.executor_idle "
+                                 "and not model.loading_metadata"
+                ),
+                Item("skip_scanned", label="Skip scanned images"),
+                Item(
+                    "cancel_scan",
+                    show_label=False,
+                    enabled_when="not model.executor_idle"
                 ),
                 Spring(),
             ),
@@ -92,12 +133,46 @@ class ImageFolderView(ModelView):
 
     @observe("scan")
     def scan_for_faces(self, event):
-        self.model.compute_num_faces_background()
+        self.model.compute_num_faces_background(resume=self.skip_scanned)
+
+    @observe("cancel_scan")
+    def _cancel_scan_fired(self, event):
+        self.model.cancel_scan()
+
+    @observe("refresh")
+    def _refresh_fired(self, event):
+        self.model.refresh()
 
     @observe("model:data_updated")
     def _update_all_data(self, event):
-        self.all_data.update(self.model.data)
-        self.update_filtered_data(None)
+        # Scans only update face counts: copy the updated ones, without
+        # filtering the rows again.
+        labels = self.model.data.index[event.new]
+        self.all_data.loc[labels, NUM_FACE_COL] = \
+            self.model.data.loc[labels, NUM_FACE_COL]
+        if self.filtered_data is not self.all_data:
+            labels = labels[labels.isin(self.filtered_data.index)]
+            self.filtered_data.loc[labels, NUM_FACE_COL] = \
+                self.all_data.loc[labels, NUM_FACE_COL]
+        self.filtered_rows_updated = labels
+
+    @observe("model:data, model:rows_changed")
+    def _reset_all_data(self, event):
+        # The model's data was replaced (e.g. once the metadata is loaded) or
+        # rows were added or removed: rebuild the enriched copy and the
+        # filters from scratch.
+        if event.name == "rows_changed" and event.new.added:
+            # Appending rows replaced the data: rebuilt already
+            return
+        self.trait_setq(
+            make_mask=self._make_mask_default(),
+            year_mask=self._year_mask_default(),
+        )
+        self.all_data = self._all_data_default()
+        self.all_years = self._all_years_default()
+        self.update_make(None)
+        if self.selected_years:
+            self.update_years(None)
 
     @observe("selected_years")
     def update_years(self, event):
@@ -112,7 +187,12 @@ class ImageFolderView(ModelView):
 
     @observe("year_mask, make_mask, all_data")
     def update_filtered_data(self, event):
-        self.filtered_data = self.all_data[self.year_mask & self.make_mask]
+        mask = self.year_mask & self.make_mask
+        # Don't copy all the rows when no filter applies
+        if mask.all():
+            self.filtered_data = self.all_data
+        else:
+            self.filtered_data = self.all_data[mask]
 
     # Initialization methods --------------------------------------------------
 
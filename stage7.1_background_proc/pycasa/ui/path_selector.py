@@ -8,8 +8,12 @@ class PathSelector(HasStrictTraits):
 
     scan_for_faces = Bool
 
+    #: Whether to also open the images in sub-folders of a folder
+    include_sub_folders = Bool
+
     view = View(Item("filepath"),
                 Item("scan_for_faces"),
+                Item("include_sub_folders"),
                 resizable=True,
                 icon=app_icon,
                 width=400, height=200,
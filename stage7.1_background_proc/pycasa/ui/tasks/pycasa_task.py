@@ -3,7 +3,7 @@ from os.path import splitext
 
 # ETS imports
 from traits.api import Instance
-from traits_futures.api import TraitsExecutor
+from traits_futures.api import CANCELLED, TraitsExecutor
 from pyface.api import error, ImageResource
 from pyface.action.api import StatusBarManager
 from pyface.tasks.api import PaneItem, SplitEditorAreaPane, Task, TaskLayout
@@ -12,6 +12,8 @@ from pyface.tasks.action.api import DockPaneToggleGroup, SGroup, SMenu, \
 
 # Local imports
 from .pycasa_browser_pane import PycasaBrowserPane
+from ...model.batch_detection import detect_faces_batch
+from ...model.detection_cache import DetectionCache
 from ...model.image_folder import ImageFolder
 from ..image_folder_editor import ImageFolderEditor
 from ...model.image_file import ImageFile, SUPPORTED_FORMATS
@@ -31,6 +33,9 @@ class PycasaTask(Task):
     #: An executor for background tasks
     traits_executor = Instance(TraitsExecutor, ())
 
+    #: Face detection results persisted across sessions
+    detection_cache = Instance(DetectionCache, ())
+
     central_pane = Instance(SplitEditorAreaPane)
 
     # Task interface ----------------------------------------------------------
@@ -55,16 +60,23 @@ class PycasaTask(Task):
 
     # Task interface ----------------------------------------------------------
 
-    def open_in_central_pane(self, filepath):
+    def open_in_central_pane(self, filepath, recursive=False):
         file_ext = splitext(filepath)[1].lower()
         if file_ext in SUPPORTED_FORMATS:
-            obj = ImageFile(filepath=filepath)
+            obj = ImageFile(
+                filepath=filepath,
+                detection_cache=self.detection_cache
+            )
             self.central_pane.edit(obj, factory=ImageFileEditor)
         elif file_ext == "":
             obj = ImageFolder(
                 directory=filepath,
-                traits_executor=self.traits_executor
+                recursive=recursive,
+                traits_executor=self.traits_executor,
+                detection_cache=self.detection_cache,
             )
+            obj.observe(self._report_scan_progress,
+                        "num_scanned, executor_idle")
             self.central_pane.edit(obj, factory=ImageFolderEditor)
         else:
             print("Unsupported file format: {}".format(file_ext))
@@ -73,6 +85,9 @@ class PycasaTask(Task):
         return obj
 
     def prepare_destroy(self):
+        # Cancels the background jobs and waits for them to stop: face scans
+        # stop after the image(s) being searched, in the GUI process or in
+        # worker processes, without waiting for the images queued.
         self.traits_executor.shutdown()
         return super().prepare_destroy()
 
@@ -82,11 +97,17 @@ class PycasaTask(Task):
         selector = PathSelector()
         ui = selector.edit_traits(kind="livemodal")
         if ui.result:
-            obj = self.open_in_central_pane(selector.filepath)
+            obj = self.open_in_central_pane(
+                selector.filepath,
+                recursive=selector.include_sub_folders
+            )
             if obj and selector.scan_for_faces:
                 self._scan_model(obj)
 
-    def scan_current_path(self):
+    def scan_current_path(self, resume=True):
+        """ Scan the active tab for faces, skipping the images already
+        scanned unless resume is False.
+        """
         if self.central_pane.active_editor is None:
             msg = "No active tab/path. You must open a path before you can " \
                   "scan it for faces"
@@ -95,17 +116,40 @@ class PycasaTask(Task):
 
         active_editor = self.central_pane.active_editor
         model = active_editor.obj
-        self._scan_model(model)
+        self._scan_model(model, resume=resume)
 
-    def _scan_model(self, model):
+    def rescan_current_path(self):
+        self.scan_current_path(resume=False)
+
+    def _scan_model(self, model, resume=True):
         self.status_bar.messages = ["Scanning..."]
 
+        # Both go through detect_faces_batch, where throughput is tuned
         if isinstance(model, ImageFolder):
-            model.compute_num_faces()
+            # Progress is reported as images get processed in the background
+            model.compute_num_faces_background(resume=resume)
         else:
-            model.detect_faces()
-
-        self.status_bar.messages = ["Scanning complete."]
+            # Keep the pixels: the image is being displayed
+            detect_faces_batch([model], keep_pixels=True)
+            self.status_bar.messages = ["Scanning complete."]
+
+    def _report_scan_progress(self, event):
+        folder = event.object
+        if folder.future is None:
+            # No scan started yet, e.g. while the folder is being listed
+            return
+        num_images = folder.num_to_scan
+        if not folder.executor_idle:
+            msg = f"Scanning {folder.directory}: {folder.num_scanned}/" \
+                  f"{num_images} images, about {folder.scan_eta:.0f}s left"
+        elif folder.future.state == CANCELLED:
+            msg = f"Scanning cancelled: {folder.num_scanned}/{num_images} " \
+                  f"images scanned."
+        elif num_images == 0:
+            msg = "Scanning complete: all images were already scanned."
+        else:
+            msg = f"Scanning complete: {num_images} images."
+        self.status_bar.messages = [msg]
 
     # Initialization methods --------------------------------------------------
 
@@ -156,6 +200,9 @@ class PycasaTask(Task):
                            accelerator='Ctrl+R',
                            method='scan_current_path',
                            image=ImageResource('zoom-draw')),
+                TaskAction(name='Rescan all images',
+                           accelerator='Ctrl+Shift+R',
+                           method='rescan_current_path'),
                 id='ScanGroup', name='ScanGroup'
             ),
             id='Tools', name='&Tools')
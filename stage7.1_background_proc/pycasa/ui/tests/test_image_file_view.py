@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+import unittest
+from os.path import dirname, join
+
+import ets_tutorial
+from pycasa.model.faces import as_face_array, empty_faces
+from pycasa.model.image_file import ImageFile
+from pycasa.ui.image_file_view import ImageFileView
+
+TUTORIAL_DIR = dirname(ets_tutorial.__file__)
+SAMPLE_IMG_DIR = join(TUTORIAL_DIR, "..", "sample_images")
+SAMPLE_IMG1 = join(SAMPLE_IMG_DIR, "IMG-0311_xmas_2020.JPG")
+SAMPLE_IMG2 = join(SAMPLE_IMG_DIR, "20220121_080128.jpg")
+
+FAKE_FACES = as_face_array([
+    {"r": 1, "c": 2, "width": 3, "height": 4},
+    {"r": 10, "c": 20, "width": 30, "height": 40},
+])
+
+
+class TestImageFileView(unittest.TestCase):
+    def test_figure_reused(self):
+        model = ImageFile(filepath=SAMPLE_IMG1)
+        view = ImageFileView(model=model)
+        figure = view.figure
+        [image] = figure.axes[0].images
+
+        model.faces = FAKE_FACES
+        model.filepath = SAMPLE_IMG2
+        self.assertIs(view.figure, figure)
+        self.assertEqual(list(figure.axes[0].images), [image])
+        self.assertEqual(image.get_array().shape,
+                         model.pyramid_level(view._level).shape)
+        self.assertEqual(figure.axes[0].get_xlim()[1],
+                         model.data.shape[1] - 0.5)
+
+    def test_pyramid_level(self):
+        model = ImageFile(filepath=SAMPLE_IMG1)
+        view = ImageFileView(model=model)
+        axes = view.figure.axes[0]
+        [image] = axes.images
+        # The default figure is less than 1024 pixels wide
+        self.assertEqual(view._level, 1)
+        self.assertEqual(image.get_array().shape, (384, 512, 3))
+        self.assertEqual(image.get_extent(), [-0.5, 1023.5, 767.5, -0.5])
+
+        # Zooming in swaps in the full resolution, panning keeps it
+        axes.set_xlim(100, 300)
+        axes.set_ylim(300, 100)
+        self.assertEqual(view._level, 0)
+        self.assertEqual(image.get_array().shape, (768, 1024, 3))
+        axes.set_xlim(200, 400)
+        self.assertEqual(view._level, 0)
+
+        axes.set_xlim(-0.5, 1023.5)
+        axes.set_ylim(767.5, -0.5)
+        self.assertEqual(view._level, 1)
+
+    def test_faces_replaced(self):
+        model = ImageFile(filepath=SAMPLE_IMG1)
+        view = ImageFileView(model=model)
+        axes = view.figure.axes[0]
+        self.assertEqual(list(axes.collections), [])
+
+        model.faces = FAKE_FACES
+        [collection] = axes.collections
+        self.assertEqual(len(collection.get_paths()), 2)
+
+        model.faces = FAKE_FACES[:1]
+        [collection] = axes.collections
+        self.assertEqual(len(collection.get_paths()), 1)
+
+        model.faces = empty_faces()
+        self.assertEqual(list(axes.collections), [])
+
+    def test_highlight_face_under_pointer(self):
+        model = ImageFile(filepath=SAMPLE_IMG1, faces=FAKE_FACES)
+        view = ImageFileView(model=model)
+        axes = view.figure.axes[0]
+        highlight = view._highlight
+        self.assertTrue(highlight.get_animated())
+        self.assertFalse(highlight.get_visible())
+
+        view._highlight_face(SimpleNamespace(inaxes=axes, xdata=30,
+                                             ydata=20))
+        self.assertTrue(highlight.get_visible())
+        self.assertEqual(highlight.get_bbox().bounds, (20, 10, 30, 40))
+
+        view._highlight_face(SimpleNamespace(inaxes=None, xdata=None,
+                                             ydata=None))
+        self.assertFalse(highlight.get_visible())
+
+        # Faces are drawn on the overlay
+        [collection] = axes.collections
+        self.assertTrue(collection.get_animated())
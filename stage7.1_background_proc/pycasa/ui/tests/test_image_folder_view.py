@@ -0,0 +1,60 @@
+import unittest
+from os.path import dirname, join
+
+from traitsui.testing.api import UITester, IsVisible
+
+import ets_tutorial
+from pycasa.model.image_folder import ImageFolder, NUM_FACE_COL
+from pycasa.ui.image_folder_view import ImageFolderView
+
+TUTORIAL_DIR = dirname(ets_tutorial.__file__)
+SAMPLE_IMG_DIR = join(TUTORIAL_DIR, "..", "sample_images")
+
+
+class TestImageFolderView(unittest.TestCase):
+    def test_image_folder_view(self):
+        # A smoke test.
+        view = ImageFolderView(model=ImageFolder(directory=SAMPLE_IMG_DIR))
+        tester = UITester()
+        with tester.create_ui(view) as ui:
+            df = tester.find_by_name(ui, "filtered_data")
+            df.inspect(IsVisible())
+
+    def test_replaced_model_data(self):
+        model = ImageFolder(directory=SAMPLE_IMG_DIR)
+        view = ImageFolderView(model=model)
+        all_data = view.all_data
+        model.data = model.data.iloc[:2].reset_index(drop=True)
+        self.assertIsNot(view.all_data, all_data)
+        self.assertEqual(len(view.all_data), 2)
+        self.assertEqual(len(view.filtered_data), 2)
+
+    def test_unfiltered_data_not_copied(self):
+        model = ImageFolder(directory=SAMPLE_IMG_DIR)
+        view = ImageFolderView(model=model)
+        self.assertIs(view.filtered_data, view.all_data)
+        view.selected_make = "Apple"
+        self.assertIsNot(view.filtered_data, view.all_data)
+
+    def test_updated_rows_only(self):
+        model = ImageFolder(directory=SAMPLE_IMG_DIR)
+        view = ImageFolderView(model=model)
+        replaced = []
+        view.observe(replaced.append, "filtered_data")
+        updated = []
+        view.observe(lambda event: updated.append(list(event.new)),
+                     "filtered_rows_updated")
+        model.data.loc[[0, 2], NUM_FACE_COL] = [2, 3]
+        model.data_updated = [0, 2]
+        # Rows are updated in place, without filtering them again
+        self.assertEqual(replaced, [])
+        self.assertEqual(updated, [[0, 2]])
+        self.assertIs(view.filtered_data, view.all_data)
+        self.assertEqual(view.all_data[NUM_FACE_COL].tolist()[::2], [2, 3])
+
+        view.filtered_data = view.all_data.iloc[[1, 2]]
+        model.data.loc[[0, 2], NUM_FACE_COL] = [4, 5]
+        model.data_updated = [0, 2]
+        self.assertEqual(updated[-1], [2])
+        self.assertEqual(view.filtered_data[NUM_FACE_COL].tolist()[1], 5)
+        self.assertEqual(view.all_data[NUM_FACE_COL].tolist()[0], 4)